@@ -0,0 +1,420 @@
+# Bytecode.py
+# =====================================================================================================================================
+# Bytecode backend: compile() turns an AST into a Code object, which VM.run() executes with a single dispatch loop over a value stack.
+# A Code object is struct-of-arrays, like the Lexer's TokenBuffer: ops holds one opcode per instruction and args its argument (a
+# constant, name or jump target index), consts and names are the constant and name pools, and lines is the line table, the index in
+# spans of the (pos_start, pos_end) of the node every instruction was compiled from. The VM gives values and errors those positions,
+# so they are the same as the Interpreter's. Function bodies are compiled to Code objects of their own, and run by VMFunctions.
+# disassemble() lists a Code object, and every function body in it, one instruction per line, for debugging.
+# Selected with MainHandler.BACKEND = 'vm'. Like Closures, every instruction does what its Interpreter handler does, in the same order.
+# =====================================================================================================================================
+
+from array import array
+
+from .ErrorHandler import RTError
+from .Interpreter import Interpreter, Number, Bool, String, Function, new_memo
+from .Resolver import pure_deps
+from .Lexer import KINDS, KEYWORDS, KIND_SYMBOLS
+from .Closures import BINARY_METHODS
+
+# how deep compile() recurses, deeper subtrees are left to the Interpreter, which runs them with exec_deep() when it has to
+MAX_RECURSION = 100
+
+OPCODES = [
+    'LOAD_NAME',        # push a copy of variable names[arg], positioned at the node
+    'STORE_NAME',       # set variable names[arg] to the top of the stack, leaving it there
+    'LOAD_NUMBER',      # push Number(consts[arg])
+    'LOAD_STRING',      # push String(consts[arg])
+    'LOAD_BOOL',        # push Bool(consts[arg])
+    'LOAD_NONE',        # push None, the value of a loop or an if that took no branch
+    'BINARY',           # pop right and left, push left.<BINARY_METHODS[arg]>(right)
+    'NEGATE',           # replace the top with top.mul(Number(-1))
+    'NOT',              # replace the top with top.not_()
+    'POSITIVE',         # reposition the top at the node, unary '+'
+    'POP',              # discard the top
+    'JUMP',             # continue at instruction arg
+    'JUMP_IF_FALSE',    # pop the top, continue at instruction arg if it isn't true_()
+    'FOR_PREP',         # pop step (only if arg is 1), end and start, push the loop's [idx, step, end, step >= 0]
+    'FOR_ITER',         # if the loop on top isn't done, push Number(idx) and step idx, else continue at instruction arg
+    'PREPARE_CALL',     # replace the function on top with a copy positioned at the call
+    'CALL',             # pop arg arguments and the function, push what calling it returns
+    'MAKE_FUNCTION',    # push a VMFunction for consts[arg], and set it as a variable if it has a name
+    'EXEC_NODE',        # push what the Interpreter makes of consts[arg], a subtree nested too deep to compile
+    'RETURN',           # return the top
+]
+for opcode, name in enumerate(OPCODES):
+    globals()[name] = opcode
+
+# opcodes whose arg is always 0, disassemble() leaves it out
+NO_ARG_OPCODES = frozenset(('LOAD_NONE', 'NEGATE', 'NOT', 'POSITIVE', 'POP', 'PREPARE_CALL', 'RETURN'))
+
+class Code:
+    def __init__(self):
+        self.ops = array('B')
+        self.args = array('I')
+        self.lines = array('I')
+        self.consts = []
+        self.names = []
+        self.spans = []
+
+    def __len__(self):
+        return len(self.ops)
+
+def compile(node):
+    compiler = Compiler()
+    compiler.compile(node)
+    compiler.emit(RETURN, 0, node)
+    return compiler.code
+
+class FunctionCode:
+    # what MAKE_FUNCTION needs to build a VMFunction, kept in the constant pool
+    def __init__(self, name, arg_names, main_node, body, deps):
+        self.name = name
+        self.arg_names = arg_names
+        self.main_node = main_node
+        self.body = body
+        # the names of the functions a pure body calls, None for one that isn't, see Resolver.pure_deps()
+        self.deps = deps
+
+class VMFunction(Function):
+    def __init__(self, fn_name, main_node, args, body):
+        super().__init__(fn_name, main_node, args)
+        self.body = body
+
+    def run(self, context):
+        return VM().run(self.body, context)
+
+    def copy(self):
+        copy = VMFunction(self.name, self.main_node, self.args, self.body)
+        copy.memo = self.memo
+        copy.set_Context(self.context)
+        copy.set_Pos(self.start_pos, self.end_pos)
+        return copy
+
+class Compiler:
+    # node type -> compile_<NodeName> function, like Interpreter.handlers
+    compilers = {}
+
+    def __init__(self):
+        self.code = Code()
+        self.depth = 0
+        # (pos_start, pos_end) of a node -> its index in code.spans, constant -> its index in code.consts, same for names
+        self.span_index = {}
+        self.const_index = {}
+        self.name_index = {}
+
+    def emit(self, op, arg, node):
+        code = self.code
+        span = (node.start, node.end)
+        line = self.span_index.get(span)
+        if line is None:
+            line = self.span_index[span] = len(code.spans)
+            code.spans.append((node.pos_start, node.pos_end))
+
+        code.ops.append(op)
+        code.args.append(arg)
+        code.lines.append(line)
+        return len(code.ops) - 1
+
+    def patch(self, at, target):
+        self.code.args[at] = target
+
+    def const(self, value):
+        # the type is part of the key, so 1, 1.0 and True get entries of their own, and a float is keyed by its hex(), so 0.0 and -0.0
+        # do too
+        key = (float, value.hex()) if type(value) is float else (type(value), value)
+        index = self.const_index.get(key)
+        if index is None:
+            index = self.const_index[key] = len(self.code.consts)
+            self.code.consts.append(value)
+        return index
+
+    def const_object(self, value):
+        self.code.consts.append(value)
+        return len(self.code.consts) - 1
+
+    def name(self, name):
+        index = self.name_index.get(name)
+        if index is None:
+            index = self.name_index[name] = len(self.code.names)
+            self.code.names.append(name)
+        return index
+
+    def compile(self, node):
+        if self.depth > MAX_RECURSION:
+            self.emit(EXEC_NODE, self.const_object(node), node)
+            return
+
+        compiler = self.compilers.get(type(node))
+        if compiler is None:
+            compiler = self.compilers[type(node)] = getattr(Compiler, f"compile_{type(node).__name__}", Compiler.no_compile_method)
+
+        self.depth += 1
+        try:
+            compiler(self, node)
+        finally:
+            self.depth -= 1
+
+    def no_compile_method(self, node):
+        raise Exception(f"No compile_{type(node).__name__} method defined")
+
+    def compile_NumberNode(self, node):
+        self.emit(LOAD_NUMBER, self.const(node.value), node)
+
+    def compile_StringNode(self, node):
+        self.emit(LOAD_STRING, self.const(node.value), node)
+
+    def compile_BoolNode(self, node):
+        self.emit(LOAD_BOOL, self.const(node.value), node)
+
+    def compile_BinOpNode(self, node):
+        self.compile(node.left)
+        self.compile(node.right)
+        self.emit(BINARY, node.op, node)
+
+    def compile_UnaryOpNode(self, node):
+        self.compile(node.node)
+        if node.op == KINDS['-']:
+            self.emit(NEGATE, 0, node)
+        elif node.op == KINDS[KEYWORDS['NOT']]:
+            self.emit(NOT, 0, node)
+        else:
+            self.emit(POSITIVE, 0, node)
+
+    def compile_VarAccessNode(self, node):
+        self.emit(LOAD_NAME, self.name(node.var_name), node)
+
+    def compile_VarAssignNode(self, node):
+        self.compile(node.value_node)
+        self.emit(STORE_NAME, self.name(node.var_name), node)
+
+    def compile_IfStatementNode(self, node):
+        exits = []
+        for check, expr in node.cases:
+            self.compile(check)
+            skip = self.emit(JUMP_IF_FALSE, 0, check)
+            self.compile(expr)
+            exits.append(self.emit(JUMP, 0, expr))
+            self.patch(skip, len(self.code))
+
+        if node.else_case:
+            self.compile(node.else_case)
+        else:
+            self.emit(LOAD_NONE, 0, node)
+
+        for at in exits:
+            self.patch(at, len(self.code))
+
+    def compile_ForStatementNode(self, node):
+        self.compile(node.start_node)
+        self.compile(node.end_node)
+        if node.step_node:
+            self.compile(node.step_node)
+        self.emit(FOR_PREP, 1 if node.step_node else 0, node)
+
+        loop = self.emit(FOR_ITER, 0, node)
+        self.emit(STORE_NAME, self.name(node.var_name), node)
+        self.emit(POP, 0, node)
+        self.compile(node.main_node)
+        self.emit(POP, 0, node)
+        self.emit(JUMP, loop, node)
+        self.patch(loop, len(self.code))
+
+        # FOR_ITER leaves the loop on the stack when it's done
+        self.emit(POP, 0, node)
+        self.emit(LOAD_NONE, 0, node)
+
+    def compile_WhileStatementNode(self, node):
+        loop = len(self.code)
+        self.compile(node.check_node)
+        done = self.emit(JUMP_IF_FALSE, 0, node)
+        self.compile(node.main_node)
+        self.emit(POP, 0, node)
+        self.emit(JUMP, loop, node)
+        self.patch(done, len(self.code))
+        self.emit(LOAD_NONE, 0, node)
+
+    def compile_FuncDefNode(self, node):
+        # a function body is compiled on its own, it runs in a new Context, never nested in the code that defines it
+        body = compile(node.main_node)
+        self.emit(MAKE_FUNCTION, self.const_object(FunctionCode(node.var_name, node.arg_names, node.main_node, body, pure_deps(node))), node)
+
+    def compile_CallNode(self, node):
+        self.compile(node.call_node)
+        self.emit(PREPARE_CALL, 0, node)
+        for arg_node in node.arg_nodes:
+            self.compile(arg_node)
+        self.emit(CALL, len(node.arg_nodes), node)
+
+    def compile_StatementsNode(self, node):
+        last = len(node.statement_nodes) - 1
+        for idx, statement in enumerate(node.statement_nodes):
+            self.compile(statement)
+            if idx != last:
+                self.emit(POP, 0, statement)
+
+class VM:
+    def run(self, code, context):
+        # runs code in context, returns (value, error) like Interpreter.exec
+        ops, args, lines, spans = code.ops, code.args, code.lines, code.spans
+        consts, names = code.consts, code.names
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+
+        while True:
+            op = ops[pc]
+            arg = args[pc]
+            pc += 1
+
+            if op == LOAD_NAME:
+                var = names[arg]
+                value = context.symbol_table.get(var)
+                pos_start, pos_end = spans[lines[pc - 1]]
+
+                if not value:
+                    return None, RTError("RuntimeError", f"{var} is not defined", context, pos_start, pos_end)
+
+                push(value.copy().set_Pos(pos_start, pos_end))
+
+            elif op == LOAD_NUMBER:
+                pos_start, pos_end = spans[lines[pc - 1]]
+                push(Number(consts[arg]).set_Context(context).set_Pos(pos_start, pos_end))
+
+            elif op == BINARY:
+                right = pop()
+                left = pop()
+                result, error = getattr(left, BINARY_METHODS[arg])(right)
+                if error: return None, error
+
+                pos_start, pos_end = spans[lines[pc - 1]]
+                push(result.set_Pos(pos_start, pos_end))
+
+            elif op == POP:
+                pop()
+
+            elif op == JUMP_IF_FALSE:
+                if not pop().true_():
+                    pc = arg
+
+            elif op == JUMP:
+                pc = arg
+
+            elif op == STORE_NAME:
+                context.symbol_table.set(names[arg], stack[-1])
+
+            elif op == FOR_ITER:
+                loop = stack[-1]
+                idx = loop[0]
+                if (idx < loop[2].value) if loop[3] else (idx > loop[2].value):
+                    push(Number(idx))
+                    loop[0] = idx + loop[1]
+                else:
+                    pc = arg
+
+            elif op == PREPARE_CALL:
+                pos_start, pos_end = spans[lines[pc - 1]]
+                stack[-1] = stack[-1].copy().set_Pos(pos_start, pos_end)
+
+            elif op == CALL:
+                call_args = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                return_val, error = pop().execute(call_args)
+                if error: return None, error
+                push(return_val)
+
+            elif op == LOAD_STRING:
+                pos_start, pos_end = spans[lines[pc - 1]]
+                push(String(consts[arg]).set_Context(context).set_Pos(pos_start, pos_end))
+
+            elif op == LOAD_BOOL:
+                pos_start, pos_end = spans[lines[pc - 1]]
+                push(Bool(consts[arg]).set_Context(context).set_Pos(pos_start, pos_end))
+
+            elif op == LOAD_NONE:
+                push(None)
+
+            elif op == NEGATE:
+                number, error = pop().mul(Number(-1))
+                if error: return None, error
+
+                pos_start, pos_end = spans[lines[pc - 1]]
+                push(number.set_Pos(pos_start, pos_end))
+
+            elif op == NOT:
+                number, error = pop().not_()
+                if error: return None, error
+
+                pos_start, pos_end = spans[lines[pc - 1]]
+                push(number.set_Pos(pos_start, pos_end))
+
+            elif op == POSITIVE:
+                pos_start, pos_end = spans[lines[pc - 1]]
+                stack[-1] = stack[-1].set_Pos(pos_start, pos_end)
+
+            elif op == FOR_PREP:
+                step_val = pop() if arg else Number(1)
+                end_val = pop()
+                start_val = pop()
+                idx = start_val.value
+                push([idx, step_val.value, end_val, step_val.value >= 0])
+
+            elif op == MAKE_FUNCTION:
+                function = consts[arg]
+                pos_start, pos_end = spans[lines[pc - 1]]
+                func_val = VMFunction(function.name, function.main_node, function.arg_names, function.body).set_Context(context).set_Pos(pos_start, pos_end)
+                func_val.memo = new_memo(function.deps)
+
+                if function.name:
+                    context.symbol_table.set(function.name, func_val)
+
+                push(func_val)
+
+            elif op == EXEC_NODE:
+                value, error = Interpreter().evaluate(consts[arg], context)
+                if error: return None, error
+                push(value)
+
+            elif op == RETURN:
+                return stack[-1], None
+
+def disassemble(code, title='<program>'):
+    # one line per instruction: index, line:col of its node, opcode and argument, then the same for every function body in code
+    lines = [f'Disassembly of {title}:']
+    functions = []
+
+    for pc in range(len(code)):
+        op, arg = code.ops[pc], code.args[pc]
+        pos_start, _ = code.spans[code.lines[pc]]
+        name = OPCODES[op]
+
+        if name in ('LOAD_NUMBER', 'LOAD_STRING', 'LOAD_BOOL'):
+            detail = repr(code.consts[arg])
+        elif name in ('LOAD_NAME', 'STORE_NAME'):
+            detail = code.names[arg]
+        elif name == 'BINARY':
+            detail = KIND_SYMBOLS[arg]
+        elif name in ('JUMP', 'JUMP_IF_FALSE', 'FOR_ITER'):
+            detail = f'to {arg}'
+        elif name == 'MAKE_FUNCTION':
+            function = code.consts[arg]
+            detail = function.name or '<lambda>'
+            functions.append(function)
+        elif name == 'EXEC_NODE':
+            detail = type(code.consts[arg]).__name__
+        else:
+            detail = ''
+
+        line = f'{pc:6} {pos_start.ln + 1:5}:{pos_start.col:<4} {name:14}'
+        if name not in NO_ARG_OPCODES:
+            line += f' {arg:5}'
+        if detail:
+            line += f' ({detail})'
+        lines.append(line)
+
+    for function in functions:
+        lines.append('')
+        lines.append(disassemble(function.body, f"<function {function.name or '<lambda>'}>"))
+
+    return '\n'.join(lines)
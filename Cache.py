@@ -0,0 +1,94 @@
+# Cache.py
+# =====================================================================================================================================
+# On-disk cache of parsed programs, the __pycache__ of this language. For a source file dir/name the parsed AST is pickled into
+# dir/__raplcache__/name.<tag>.pickle, where the tag names the interpreter version and a fingerprint of the modules that define the
+# AST (Lexer, Parser, Position), so changing any of them retires every old cache file instead of unpickling something stale.
+# Each cache file starts with the sha256 of (tag, filename, source), and is only used when that matches the source being run,
+# so an edited file is re-parsed and its cache file rewritten. Files are written to a temporary name and os.replace()d into place,
+# so a reader never sees half a cache file. Any problem reading or writing the cache just means parsing as usual.
+# Setting CACHE_DIR to None turns the cache off.
+# =====================================================================================================================================
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+VERSION = '2.0'
+CACHE_DIR = '__raplcache__'
+
+# filled in by interpreter_tag() the first time the cache is used
+TAG = None
+
+def interpreter_tag():
+    global TAG
+
+    if TAG is None:
+        from . import Lexer, Parser, Position
+
+        fingerprint = hashlib.sha256()
+        for module in (Lexer, Parser, Position):
+            with open(module.__file__, 'rb') as file:
+                fingerprint.update(file.read())
+        TAG = f'rapl{VERSION}-{fingerprint.hexdigest()[:12]}'
+
+    return TAG
+
+def cache_path(fn):
+    # only programs that come from a real file are cached, '<stdin>' and friends are not
+    if CACHE_DIR is None or not os.path.isfile(fn):
+        return None
+
+    directory, name = os.path.split(os.path.abspath(fn))
+    return os.path.join(directory, CACHE_DIR, f'{name}.{interpreter_tag()}.pickle')
+
+def source_key(fn, source):
+    key = hashlib.sha256()
+    key.update(interpreter_tag().encode())
+    key.update(b'\0' + fn.encode('utf-8', 'surrogatepass') + b'\0')
+    key.update(source.encode('utf-8', 'surrogatepass'))
+    return key.digest()
+
+def load(fn, source):
+    path = cache_path(fn)
+    if path is None:
+        return None
+
+    try:
+        with open(path, 'rb') as file:
+            key = source_key(fn, source)
+            if file.read(len(key)) != key:
+                return None
+            return pickle.load(file)
+    except Exception:
+        # missing, truncated or otherwise unreadable, parse as usual
+        return None
+
+def store(fn, source, node):
+    path = cache_path(fn)
+    if path is None:
+        return False
+
+    try:
+        data = pickle.dumps(node, protocol=pickle.HIGHEST_PROTOCOL)
+    except (RecursionError, pickle.PicklingError):
+        # too deep to pickle, it will be parsed again next time
+        return False
+
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.pickle')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(source_key(fn, source))
+                file.write(data)
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+    except OSError:
+        # read-only or full directory, caching is best effort
+        return False
+
+    return True
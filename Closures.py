@@ -0,0 +1,317 @@
+# Closures.py
+# =====================================================================================================================================
+# Closure-compilation backend. compile() turns an AST into a tree of Python closures, one per node, each taking a Context and
+# returning (value, error) exactly like the Interpreter's handle_<NodeName> method for that node. Everything that only depends on the
+# node is worked out once, when it is compiled: its children's closures, its positions, and for a BinOpNode or UnaryOpNode the Value
+# method its operator calls. Running the program then never looks up a handler or compares an operator again.
+# Functions defined by compiled code are CompiledFunctions, which run their compiled body when called.
+# Selected with MainHandler.BACKEND = 'closures'. The Interpreter stays the reference: every closure below does what its handler does,
+# in the same order, so both backends give the same values and the same errors.
+# =====================================================================================================================================
+
+from .ErrorHandler import RTError
+from .Interpreter import Interpreter, Number, Bool, String, Function, new_memo
+from .Resolver import pure_deps
+from .Lexer import KINDS, KEYWORDS
+
+# how deep compile() recurses, deeper subtrees are left to the Interpreter, which runs them with exec_deep() when it has to
+MAX_RECURSION = 100
+
+# operator kind -> the Value method handle_BinOpNode calls for it
+BINARY_METHODS = {
+    KINDS['+']: 'add',
+    KINDS['-']: 'sub',
+    KINDS['*']: 'mul',
+    KINDS['/']: 'div',
+    KINDS['^']: 'pow',
+    KINDS['==']: 'compare_ee',
+    KINDS['!=']: 'compare_ne',
+    KINDS['<']: 'compare_lt',
+    KINDS['>']: 'compare_gt',
+    KINDS['<=']: 'compare_le',
+    KINDS['>=']: 'compare_ge',
+    KINDS[KEYWORDS['AND']]: 'and_',
+    KINDS[KEYWORDS['OR']]: 'or_',
+}
+
+def compile(node):
+    return Compiler().compile(node)
+
+class CompiledFunction(Function):
+    def __init__(self, fn_name, main_node, args, body):
+        super().__init__(fn_name, main_node, args)
+        self.body = body
+
+    def run(self, context):
+        return self.body(context)
+
+    def copy(self):
+        copy = CompiledFunction(self.name, self.main_node, self.args, self.body)
+        copy.memo = self.memo
+        copy.set_Context(self.context)
+        copy.set_Pos(self.start_pos, self.end_pos)
+        return copy
+
+class Compiler:
+    # node type -> compile_<NodeName> function, like Interpreter.handlers
+    compilers = {}
+
+    def __init__(self):
+        self.depth = 0
+
+    def compile(self, node):
+        if self.depth > MAX_RECURSION:
+            return self.compile_deep(node)
+
+        compiler = self.compilers.get(type(node))
+        if compiler is None:
+            compiler = self.compilers[type(node)] = getattr(Compiler, f"compile_{type(node).__name__}", Compiler.no_compile_method)
+
+        self.depth += 1
+        try:
+            return compiler(self, node)
+        finally:
+            self.depth -= 1
+
+    def no_compile_method(self, node):
+        raise Exception(f"No compile_{type(node).__name__} method defined")
+
+    def compile_deep(self, node):
+        # past MAX_RECURSION the closures would nest as deep as the tree, so the subtree runs on the Interpreter instead
+        def run(context):
+            return Interpreter().evaluate(node, context)
+        return run
+
+    def compile_NumberNode(self, node):
+        value, pos_start, pos_end = node.value, node.pos_start, node.pos_end
+        def run(context):
+            return Number(value).set_Context(context).set_Pos(pos_start, pos_end), None
+        return run
+
+    def compile_BoolNode(self, node):
+        value, pos_start, pos_end = node.value, node.pos_start, node.pos_end
+        def run(context):
+            return Bool(value).set_Context(context).set_Pos(pos_start, pos_end), None
+        return run
+
+    def compile_StringNode(self, node):
+        value, pos_start, pos_end = node.value, node.pos_start, node.pos_end
+        def run(context):
+            return String(value).set_Context(context).set_Pos(pos_start, pos_end), None
+        return run
+
+    def compile_BinOpNode(self, node):
+        left_run = self.compile(node.left)
+        right_run = self.compile(node.right)
+        method = BINARY_METHODS[node.op]
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def run(context):
+            left, error = left_run(context)
+            if error: return None, error
+
+            right, error = right_run(context)
+            if error: return None, error
+
+            result, error = getattr(left, method)(right)
+            if error:
+                return None, error
+            else:
+                return result.set_Pos(pos_start, pos_end), None
+        return run
+
+    def compile_UnaryOpNode(self, node):
+        operand_run = self.compile(node.node)
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        if node.op == KINDS['-']:
+            def run(context):
+                number, error = operand_run(context)
+                if error: return None, error
+
+                number, error = number.mul(Number(-1))
+                if error:
+                    return None, error
+                else:
+                    return number.set_Pos(pos_start, pos_end), None
+        elif node.op == KINDS[KEYWORDS['NOT']]:
+            def run(context):
+                number, error = operand_run(context)
+                if error: return None, error
+
+                number, error = number.not_()
+                if error:
+                    return None, error
+                else:
+                    return number.set_Pos(pos_start, pos_end), None
+        else:
+            def run(context):
+                number, error = operand_run(context)
+                if error: return None, error
+
+                return number.set_Pos(pos_start, pos_end), None
+        return run
+
+    def compile_VarAccessNode(self, node):
+        var = node.var_name
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def run(context):
+            value = context.symbol_table.get(var)
+
+            if not value:
+                error = RTError("RuntimeError", f"{var} is not defined", context, pos_start, pos_end)
+                return None, error
+
+            return value.copy().set_Pos(pos_start, pos_end), None
+        return run
+
+    def compile_VarAssignNode(self, node):
+        var = node.var_name
+        value_run = self.compile(node.value_node)
+
+        def run(context):
+            value, error = value_run(context)
+            if error: return None, error
+
+            context.symbol_table.set(var, value)
+            return value, None
+        return run
+
+    def compile_IfStatementNode(self, node):
+        cases = [(self.compile(check), self.compile(expr)) for check, expr in node.cases]
+        else_run = self.compile(node.else_case) if node.else_case else None
+
+        def run(context):
+            for check_run, expr_run in cases:
+                check_result, error = check_run(context)
+                if error: return None, error
+
+                if check_result.true_():
+                    expr_result, error = expr_run(context)
+                    if error: return None, error
+                    return expr_result, error
+
+            if else_run:
+                else_result, error = else_run(context)
+                if error: return None, error
+                return else_result, error
+
+            return None, None
+        return run
+
+    def compile_ForStatementNode(self, node):
+        var = node.var_name
+        start_run = self.compile(node.start_node)
+        end_run = self.compile(node.end_node)
+        step_run = self.compile(node.step_node) if node.step_node else None
+        main_run = self.compile(node.main_node)
+
+        def run(context):
+            start_val, error = start_run(context)
+            if error: return None, error
+
+            end_val, error = end_run(context)
+            if error: return None, error
+
+            if step_run:
+                step_val, error = step_run(context)
+                if error: return None, error
+            else:
+                step_val = Number(1)
+
+            idx = start_val.value
+            step = step_val.value
+            symbol_table = context.symbol_table
+
+            if step >= 0:
+                end = end_val.value
+                while idx < end:
+                    symbol_table.set(var, Number(idx))
+                    idx += step
+
+                    _, error = main_run(context)
+                    if error: return None, error
+            else:
+                end = end_val.value
+                while idx > end:
+                    symbol_table.set(var, Number(idx))
+                    idx += step
+
+                    _, error = main_run(context)
+                    if error: return None, error
+
+            return None, None
+        return run
+
+    def compile_WhileStatementNode(self, node):
+        check_run = self.compile(node.check_node)
+        main_run = self.compile(node.main_node)
+
+        def run(context):
+            while True:
+                check, error = check_run(context)
+                if error: return None, error
+
+                if not check.true_(): break
+
+                _, error = main_run(context)
+                if error: return None, error
+
+            return None, None
+        return run
+
+    def compile_FuncDefNode(self, node):
+        func = node.var_name
+        args = node.arg_names
+        main_node = node.main_node
+        # a function body is compiled on its own, it runs in a new Context, never nested in the code that defines it
+        body = Compiler().compile(main_node)
+        pos_start, pos_end = node.pos_start, node.pos_end
+        # the tree isn't resolved, so whether the function is pure is worked out here, see Function.execute() for its Memo
+        deps = pure_deps(node)
+
+        def run(context):
+            func_val = CompiledFunction(func, main_node, args, body).set_Context(context).set_Pos(pos_start, pos_end)
+            func_val.memo = new_memo(deps)
+
+            if func:
+                context.symbol_table.set(func, func_val)
+
+            return func_val, None
+        return run
+
+    def compile_CallNode(self, node):
+        call_run = self.compile(node.call_node)
+        arg_runs = [self.compile(arg_node) for arg_node in node.arg_nodes]
+        pos_start, pos_end = node.pos_start, node.pos_end
+
+        def run(context):
+            args = []
+
+            call_val, error = call_run(context)
+            if error: return None, error
+
+            call_val = call_val.copy().set_Pos(pos_start, pos_end)
+
+            for arg_run in arg_runs:
+                arg, error = arg_run(context)
+                args.append(arg)
+                if error: return None, error
+
+            return_val, error = call_val.execute(args)
+            if error: return None, error
+            return return_val, None
+        return run
+
+    def compile_StatementsNode(self, node):
+        statement_runs = [self.compile(statement) for statement in node.statement_nodes]
+
+        def run(context):
+            value = None
+            for statement_run in statement_runs:
+                value, error = statement_run(context)
+                if error: return None, error
+
+            return value, None
+        return run
@@ -1,6 +1,8 @@
 class Context:
+    __slots__ = ('trace', 'origin', 'origin_entry_pos', 'symbol_table')
+
     def __init__(self, trace, origin=None, origin_entry_pos=None):
         self.trace = trace
         self.origin = origin
         self.origin_entry_pos = origin_entry_pos
-        self.symbol_table = None
\ No newline at end of file
+        self.symbol_table = None
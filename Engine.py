@@ -0,0 +1,90 @@
+# Engine.py
+# =====================================================================================================================================
+# Engines, for embedding RAPL in a program that runs scripts on many threads at once. An Engine owns the global context its programs
+# run in: its own nil and built-ins, and every global, function and Memo they define, so what one Engine's programs store is never
+# seen by another's. A run's Interpreter (or Governor, closures, bytecode or Python code) is made for that run, and so is its tree when
+# it comes from source or a Cache file. The functions in it get their Scope, with its frame pool, from the Resolver on every run. A tree
+# run from an Incremental Document is the one exception: the nodes the Optimizer and Resolver leave as they are, and the InlineCaches
+# in them, are shared by every Engine that runs the Document, which InlineCache allows for by replacing its last entry in one store.
+# Runs on different Engines share nothing else they write to, and run side by side on as many threads as they like.
+# Runs on the same Engine share its globals, and take turns: each statement holds the Engine's lock while it runs, so statements from
+# two threads never interleave, and a run started from inside another (by a Python function a program calls) can still take it.
+# MainHandler's functions run on DEFAULT, which holds Interpreter.Global_Context, unless they are given an Engine.
+# scaling() times runs on a number of threads, each on its own Engine, to see how they scale.
+# =====================================================================================================================================
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import Interpreter
+
+# what scaling() runs when it isn't given a program
+SCALING_SOURCE = """fn fib(n) -> if n < 2 do n else fib(n - 1) + fib(n - 2)
+set total = 0
+for i from 0 to 2000 do set total = total + fib(12) * i
+total"""
+
+class Engine:
+    def __init__(self, context=None, record=False):
+        # the global context every run on the Engine runs in, a new one unless it is given one
+        self.context = context or Interpreter.global_context()
+        self.lock = threading.RLock()
+        # whether MainHandler.Execute keeps every tree it runs in trees, for inline_caches()
+        self.record = record
+        self.trees = []
+
+    def Run(self, fn, source, limits=None):
+        from . import MainHandler
+        return MainHandler.Run(fn, source, limits, self)
+
+    def RunStatements(self, fn, source, limits=None):
+        from . import MainHandler
+        return MainHandler.RunStatements(fn, source, limits, self)
+
+    def RunDocument(self, document, limits=None):
+        from . import MainHandler
+        return MainHandler.RunDocument(document, limits, self)
+
+    def RunFile(self, path, limits=None):
+        from . import MainHandler
+        return MainHandler.RunFile(path, limits, self)
+
+    def inline_caches(self):
+        # (node, hits, misses) for every operator in the trees the Engine ran, added up by source span, so a site run by many runs (or
+        # from a function's body, which each run resolves into a tree of its own) is counted once, in source order. Only an Engine
+        # made with record set keeps its trees, and only the interpreter fills the caches
+        with self.lock:
+            sites = {}
+            for tree in self.trees:
+                for node, hits, misses in Interpreter.inline_caches(tree):
+                    span = (node.pos_start.fn, node.pos_start.idx, node.pos_end.idx)
+                    site = sites.get(span)
+                    sites[span] = (node, hits, misses) if site is None else (site[0], site[1] + hits, site[2] + misses)
+            return [sites[span] for span in sorted(sites)]
+
+    def memoize(self, name, limit=Interpreter.MEMO_LIMIT):
+        # Interpreter.memoize() for a function in the Engine's globals
+        with self.lock:
+            return Interpreter.memoize(name, limit, self.context)
+
+# the Engine of every run that isn't given one
+DEFAULT = Engine(Interpreter.Global_Context)
+
+def scaling(thread_counts=(1, 2, 4, 8), runs=32, source=SCALING_SOURCE):
+    # runs source runs times on each number of threads in thread_counts, each run on a new Engine, and gives (threads, seconds, runs
+    # per second) for each. A run's error is raised as an Exception, so a broken program can't pass for a fast one
+    def run(_):
+        result, error = Engine().Run('<scaling>', source)
+        if error: raise Exception(str(error))
+        return result
+
+    timings = []
+    for threads in thread_counts:
+        with ThreadPoolExecutor(threads) as pool:
+            start = time.perf_counter()
+            for _ in pool.map(run, range(runs)):
+                pass
+            seconds = time.perf_counter() - start
+        timings.append((threads, seconds, runs / seconds))
+    return timings
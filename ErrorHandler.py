@@ -27,13 +27,18 @@ class Error():
     def __str__(self):
         result = self.build_traceback()
         result += f"   {self.name}: {self.message}" if self.message else f"   {self.name}"
-        result += '\n' + str_arrow(self.pos_start.fc, self.pos_start, self.pos_end)
+        if self.pos_start:
+            result += '\n' + str_arrow(self.pos_start.fc, self.pos_start, self.pos_end)
         return result
 
 class IllegalCharacter_(Error):
     def __init__(self, message, context=None, pos_start=None, pos_end=None):
         super().__init__("IllegalCharacter", message, context, pos_start, pos_end)
 
+class FileError_(Error):
+    # a program that couldn't be read, or isn't UTF-8, which has no position to point at
+    def __init__(self, message, context=None, pos_start=None, pos_end=None):
+        super().__init__("FileError", message, context, pos_start, pos_end)
 
 class SyntaxError_(Error):
     def __init__(self, message, context=None, pos_start=None, pos_end=None):
@@ -42,3 +47,14 @@ class SyntaxError_(Error):
 class RTError(Error):
     def __init__(self, name, message, context, pos_start, pos_end):
         super().__init__(name if name else "RuntimeError", message, context, pos_start, pos_end)
+
+class RTException(Exception):
+    # an RTError on its way up through the Interpreter's handlers, which raise it instead of returning it, see Interpreter.evaluate()
+    def __init__(self, error):
+        super().__init__(error.message)
+        self.error = error
+
+class LimitError_(RTError):
+    # a run going over one of the limits it was given, see Governor
+    def __init__(self, message, context, pos_start, pos_end):
+        super().__init__("LimitError", message, context, pos_start, pos_end)
@@ -0,0 +1,296 @@
+# Governor.py
+# =====================================================================================================================================
+# Limits on what a run may use, for programs that can't be trusted not to loop forever or fill memory. A run given Limits runs on a
+# Governor, an Interpreter that
+#  - charges nodes where a program can run the same nodes again: every statement is charged all its nodes once, and every time round
+#    a for or while loop, and every call, the nodes of the body it runs again. Whether each branch of an if in it runs or not, so the
+#    count is an upper bound on the nodes run. The run stops once it is charged more than nodes of them, and the clock is looked at
+#    every CHECK_EVERY nodes charged, stopping it once it has run for more than seconds. exec() itself counts nothing, so a loop body
+#    runs at the speed it runs at without limits, with one extra call each time round
+#  - counts the calls in progress, stopping a call that would be more than depth deep. A call a function ends in doesn't add to it,
+#    it takes the place of the call it ends (see Interpreter.TailCall)
+#  - checks the size of what an operator or a built-in makes, an int may have digits digits, and a string or an array length
+#    characters or elements: a '^', a string '*' and range() before they are worked out, from their operands or args, the ints and
+#    strings '+' and '*' make after, as they are at most twice the size of their operands. An int '+' or '-' is never checked, it is
+#    at most one bit bigger than its operands
+# Going over a limit raises a LimitError_ at the node that did, which ends the run like any other RTError. The limits hold for the
+# whole run, every statement of it, which always runs on the Interpreter, whatever MainHandler.BACKEND is, and the Optimizer folds
+# nothing over them, see optimize(). A run without limits runs on the Interpreter itself and pays nothing for any of this.
+# =====================================================================================================================================
+
+import math
+import sys
+import time
+
+from . import Optimizer
+from .ErrorHandler import RTError, RTException, LimitError_
+from .Interpreter import Interpreter, InlineCache, Number, String, Array, Function, TailCall, builtin_range, box, truthy
+from .Optimizer import CHILDREN
+from .Lexer import KINDS
+
+# how many nodes a Governor charges between looks at the clock
+CHECK_EVERY = 1000
+
+# bigger than any int's bits or string's length, for a limit that isn't set
+NO_LIMIT = sys.maxsize
+
+POW, MUL, ADD = KINDS['^'], KINDS['*'], KINDS['+']
+# the operators whose result can be far bigger than their operands
+SIZED = frozenset((POW, MUL))
+
+class Limits:
+    # what a run may use, None for no limit on it: nodes run, seconds of wall time, depth of calls in progress, digits of an int and
+    # length of a string or an array
+    def __init__(self, nodes=None, seconds=None, depth=None, digits=None, length=None):
+        self.nodes = nodes
+        self.seconds = seconds
+        self.depth = depth
+        self.digits = digits
+        self.length = length
+
+class Governor(Interpreter):
+    def __init__(self, limits):
+        super().__init__()
+        self.limits = limits
+        # nodes that can be charged before the next check(), out of the chunk check() last handed out, and the budget left besides,
+        # None for no budget
+        self.ticks = 0
+        self.chunk = 0
+        self.nodes = limits.nodes
+        self.deadline = time.monotonic() + limits.seconds if limits.seconds is not None else None
+        # calls in progress
+        self.calls = 0
+        # the most bits an int with limits.digits digits has, and the longest string or array, NO_LIMIT for no limit on them, so checking
+        # them takes one comparison
+        self.bits = math.ceil(limits.digits * math.log2(10)) if limits.digits is not None else NO_LIMIT
+        self.length = limits.length if limits.length is not None else NO_LIMIT
+        # node -> how many nodes there are in its tree, see size()
+        self.sizes = {}
+
+    def optimize(self, node):
+        # Optimizer.optimize(), folding no int or string bigger than the limits
+        return Optimizer.optimize(node, min(self.bits, Optimizer.MAX_FOLD_BITS), min(self.length, Optimizer.MAX_FOLD_LENGTH))
+
+    def evaluate(self, node, context):
+        # Interpreter.evaluate(), charged every node of the statement, which includes every node a tree too deep for exec() to
+        # recurse into runs with exec_deep(). Calls can run out of Python's stack before they are depth deep, which stops the run
+        # like going over depth does
+        try:
+            self.charge(self.size(node), node, context)
+            return Interpreter.evaluate(self, node, context)
+        except RTException as exception:
+            return None, exception.error
+        except RecursionError:
+            return None, LimitError_("call depth limit exceeded, out of stack", context, node.pos_start, node.pos_end)
+
+    def size(self, node):
+        size = self.sizes.get(node)
+        if size is not None:
+            return size
+
+        size = 0
+        stack = [node]
+        while stack:
+            item = stack.pop()
+            size += 1
+            for name in CHILDREN.get(type(item), ()):
+                value = getattr(item, name)
+                if type(value) is list:
+                    for entry in value:
+                        stack.extend(entry if type(entry) is tuple else (entry, ))
+                elif value is not None:
+                    stack.append(value)
+
+        self.sizes[node] = size
+        return size
+
+    def charge(self, nodes, node, context):
+        self.ticks -= nodes
+        if self.ticks < 0:
+            self.check(node, context)
+
+    def check(self, node, context):
+        # once the last chunk is used up: stops the run when it is out of time or nodes, or hands out the next chunk
+        if self.nodes is not None:
+            self.nodes -= self.chunk - self.ticks
+            if self.nodes < 0:
+                self.stop(f"limit of {self.limits.nodes} nodes exceeded", node, context)
+
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.stop(f"time limit of {self.limits.seconds}s exceeded", node, context)
+
+        self.chunk = self.ticks = CHECK_EVERY if self.nodes is None else min(CHECK_EVERY, self.nodes)
+
+    def stop(self, message, node, context):
+        raise RTException(LimitError_(message, context, node.pos_start, node.pos_end))
+
+    def loop_handler(self, node):
+        # Interpreter.loop_handler(), charging the body each time round
+        handler = Interpreter.loop_handler(self, node)
+        size = self.size(node)
+
+        def run(self, node, context):
+            self.ticks -= size
+            if self.ticks < 0:
+                self.check(node, context)
+            return handler(self, node, context)
+        return run
+
+    def handle_WhileStatementNode(self, node, context):
+        check_node, main_node = node.check_node, node.main_node
+        size = self.size(check_node) + self.size(main_node)
+
+        while True:
+            self.ticks -= size
+            if self.ticks < 0:
+                self.check(node, context)
+            if not truthy(self.exec(check_node, context)):
+                return None
+            self.exec(main_node, context)
+
+    def handle_CallNode(self, node, context):
+        # Interpreter.handle_CallNode(), charging the call a function ends in here, as Interpreter.call() makes it without call()
+        call_val = self.exec(node.call_node, context)
+
+        if type(call_val) is Function:
+            args = [self.exec(arg_node, context) for arg_node in node.arg_nodes]
+            if node.tail:
+                self.charge(self.size(call_val.main_node), node, context)
+                return TailCall(call_val, args, node)
+            return self.call(call_val, args, node)
+
+        call_val = box(call_val, context, node.call_node).copy().set_Pos(node.pos_start, node.pos_end)
+        args = [box(self.exec(arg_node, context), context, arg_node) for arg_node in node.arg_nodes]
+        return self.execute(call_val, args, node)
+
+    def call(self, function, args, node):
+        # Interpreter.call(), with the body charged and the calls in progress counted. Like an error in the args, the error is in the
+        # function's context
+        depth = self.limits.depth
+        if depth is not None and self.calls >= depth:
+            raise RTException(LimitError_(f"call depth limit of {depth} exceeded", function.context, node.pos_start, node.pos_end))
+
+        main_node = function.main_node
+        self.ticks -= self.sizes.get(main_node) or self.size(main_node)
+        if self.ticks < 0:
+            self.check(node, function.context)
+
+        self.calls += 1
+        try:
+            return Interpreter.call(self, function, args, node)
+        finally:
+            self.calls -= 1
+
+    def execute(self, function, args, node):
+        # Interpreter.execute(), with the length of an array a built-in makes checked, range()'s before it is made
+        if getattr(function, 'run', None) is builtin_range:
+            count = range_length(args)
+            if count is not None and count > self.length:
+                self.stop(f"result over the limit of {self.length} elements", node, function.context)
+
+        value = Interpreter.execute(self, function, args, node)
+        if type(value) is Array and len(value.value) > self.length:
+            self.stop(f"result over the limit of {self.length} elements", node, function.context)
+        return value
+
+    def handle_BinOpNode(self, node, context):
+        # Interpreter.handle_BinOpNode(), with the operands of a big '^' or '*' and the result of every operator that can grow checked
+        left = self.exec(node.left, context)
+        right = self.exec(node.right, context)
+
+        op = node.op
+        sized = op in SIZED
+        if sized:
+            count = right.value if type(right) is Number else right
+            # an operator with a right operand of 2 or less makes at most twice the size of its left one, checked after
+            if type(count) is int and count > 2:
+                self.check_operands(node, left, right, context)
+
+        cache = node.cache
+        if cache is None:
+            cache = node.cache = InlineCache()
+
+        left_type, right_type = type(left), type(right)
+        last = cache.last
+        if left_type is last[0] and right_type is last[1]:
+            operation = last[2]
+        else:
+            operation = cache.lookup(op, left_type, right_type)
+
+        if operation is None:
+            cache.misses += 1
+            return self.binop(node, left, right, context)
+
+        cache.hits += 1
+        try:
+            value = operation(left, right)
+        except ZeroDivisionError:
+            return self.binop(node, left, right, context)
+        except OverflowError:
+            self.overflow(node, context)
+
+        # check_size(), inline: only a '+' or '*' makes a string, and only a '^' or '*' an int much bigger than its operands
+        value_type = type(value)
+        if value_type is str:
+            if len(value) > self.length:
+                self.stop(f"result over the limit of {self.length} characters", node, context)
+        elif sized and value_type is int and value.bit_length() > self.bits:
+            self.stop(f"result over the limit of {self.limits.digits} digits", node, context)
+
+        if left_type is Number:
+            return Number(value).set_Context(left.context).set_Pos(node.pos_start, node.pos_end)
+        return value
+
+    def binop(self, node, left, right, context):
+        # Interpreter.binop(), what handle_BinOpNode() has no cached operation for and exec_deep() runs, checked like it
+        op = node.op
+        if op in SIZED:
+            self.check_operands(node, left, right, context)
+
+        try:
+            value = Interpreter.binop(self, node, left, right, context)
+        except OverflowError:
+            self.overflow(node, context)
+        if op == ADD or op == MUL or op == POW:
+            self.check_size(value, node, context)
+        return value
+
+    def check_operands(self, node, left, right, context):
+        # stops a '^' of ints or a '*' of a string whose result would be over the limit, before it is worked out
+        left = left.value if type(left) is Number or type(left) is String else left
+        right = right.value if type(right) is Number else right
+        if type(right) is not int:
+            return
+
+        if node.op == POW:
+            if type(left) is int and abs(left) > 1 and right > 0 and math.log2(abs(left)) * right > self.bits:
+                self.stop(f"result over the limit of {self.limits.digits} digits", node, context)
+        elif type(left) is str and len(left) * right > self.length:
+            self.stop(f"result over the limit of {self.length} characters", node, context)
+
+    def overflow(self, node, context):
+        # a float '^' too big for a float, like 2.0 ^ 5000 or 2 ^ 99999999.0, which Python raises an OverflowError for
+        raise RTException(RTError("OverflowError", "Result too large", context, node.pos_start, node.pos_end))
+
+    def check_size(self, value, node, context):
+        value = value.value if type(value) is Number or type(value) is String else value
+        if type(value) is int:
+            if value.bit_length() > self.bits:
+                self.stop(f"result over the limit of {self.limits.digits} digits", node, context)
+        elif type(value) is str:
+            if len(value) > self.length:
+                self.stop(f"result over the limit of {self.length} characters", node, context)
+
+def range_length(args):
+    # how many elements range() makes of args, None for args it will report an error for
+    if len(args) not in (2, 3) or any(type(arg) is not Number for arg in args):
+        return None
+
+    start, end = args[0].value, args[1].value
+    step = args[2].value if len(args) == 3 else 1
+    try:
+        if type(start) is int and type(end) is int and type(step) is int:
+            return len(range(start, end, step))
+        return max(0, math.ceil((end - start) / step))
+    except (TypeError, ValueError, ZeroDivisionError, OverflowError):
+        return None
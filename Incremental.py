@@ -0,0 +1,120 @@
+# Incremental.py
+# =====================================================================================================================================
+# Incremental re-lexing and re-parsing, for editors and REPLs that re-run the same buffer after every small edit.
+# A Document keeps its token list, its AST and a memo of every expr() the parser completed (start token index -> (node, token count)).
+# On edit() only the tokens around the edited range are re-lexed, until the new tokens line up with the old ones again. The old tokens
+# after that point are kept and their offsets shifted, and so are the spans of the memoized AST nodes built from them.
+# IncrementalParser then reuses every memoized expr() whose tokens, and the one token of lookahead after them, were not touched.
+# =====================================================================================================================================
+
+from array import array
+from bisect import bisect_left
+
+from .Lexer import Lexer
+from .Parser import Parser, Node
+from .Result import ParseResult
+
+class IncrementalParser(Parser):
+    def __init__(self, tokens, memo=None):
+        self.memo = {} if memo is None else memo
+        super().__init__(tokens)
+
+    def expr(self):
+        start = self.idx
+        reused = self.memo.get(start)
+
+        if reused:
+            node, count = reused
+            self.idx = start + count - 1
+            self.advance()
+            result = ParseResult()
+            result.advance_count = count
+            return result.ok(node)
+
+        result = super().expr()
+        if not result.error:
+            self.memo[start] = (result.node, self.idx - start)
+        return result
+
+class Document:
+    def __init__(self, fn, text):
+        self.fn = fn
+        self.load(text)
+
+    def load(self, text):
+        self.text = text
+        self.tokens, self.lexer_error = Lexer(self.fn, text).tokenize()
+        self.memo = {}
+        self.ast = IncrementalParser(self.tokens, self.memo).parse()
+        self.error = self.lexer_error or self.ast.error
+        return self.ast
+
+    def edit(self, start, end, replacement):
+        text = self.text[:start] + replacement + self.text[end:]
+
+        if self.lexer_error:
+            # the old tokens stop at the error, there is nothing reliable to line up with
+            return self.load(text)
+
+        tokens = self.tokens
+        kinds, starts, ends = tokens.kinds, tokens.starts, tokens.ends
+        delta = len(replacement) - (end - start)
+        new_end = start + len(replacement)
+
+        # first token the edit touches or extends, lexing resumes right after the token before it
+        first = bisect_left(ends, start)
+        resume = ends[first - 1] if first else 0
+
+        lexer = Lexer(self.fn, text)
+        new_kinds, new_starts, new_ends = array('B'), array('I'), array('I')
+        sync = None
+
+        for kind, new_start, new_stop in lexer.generate(resume):
+            if new_start >= new_end:
+                # past the edit the text is the old text shifted by delta, so an old token with the same kind and shifted span is the same token
+                old_idx = bisect_left(starts, new_start - delta, lo=first)
+                if old_idx < len(kinds) and kinds[old_idx] == kind and starts[old_idx] + delta == new_start and ends[old_idx] + delta == new_stop:
+                    sync = old_idx
+                    break
+            new_kinds.append(kind)
+            new_starts.append(new_start)
+            new_ends.append(new_stop)
+
+        if lexer.error or sync is None:
+            return self.load(text)
+
+        shift = len(new_kinds) - (sync - first)
+
+        memo = {}
+        moved = []
+        for idx, (node, count) in self.memo.items():
+            if idx + count < first:
+                memo[idx] = (node, count)
+            elif idx >= sync:
+                memo[idx + shift] = (node, count)
+                moved.append(node)
+
+        # memo entries nest, so every node is shifted once however many entries reach it
+        seen = set()
+        while moved:
+            node = moved.pop()
+            if isinstance(node, (list, tuple)):
+                moved.extend(node)
+            elif isinstance(node, Node) and id(node) not in seen:
+                seen.add(id(node))
+                node.shift(delta)
+                moved.extend(getattr(node, name) for name in type(node).__slots__)
+
+        kinds[first:sync] = new_kinds
+        starts[first:sync] = new_starts
+        ends[first:sync] = new_ends
+        tail = first + len(new_kinds)
+        starts[tail:] = array('I', [idx + delta for idx in starts[tail:]])
+        ends[tail:] = array('I', [idx + delta for idx in ends[tail:]])
+        tokens.src.set_text(text)
+
+        self.text = text
+        self.memo = memo
+        self.ast = IncrementalParser(tokens, memo).parse()
+        self.error = self.ast.error
+        return self.ast
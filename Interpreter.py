@@ -1,11 +1,26 @@
-from .ErrorHandler import RTError
+import operator
+from array import array
+from collections import OrderedDict
+from itertools import repeat
+
+from .ErrorHandler import RTError, RTException
 from .SymbolTable import SymbolTable
 from .Value import Value
 from .Context import Context
-from .Lexer import TOKENS, KEYWORDS
+from .Lexer import KINDS, KEYWORDS
+from .Parser import BinOpNode, UnaryOpNode, VarAssignNode, CallNode
 
 null = "nil"
 
+# how deep exec() recurses before exec_deep() takes over, which evaluates operator, call and 'set' chains with an explicit stack
+MAX_RECURSION = 100
+
+# how many results a pure function keeps, see Memo, 0 turns memoizing the functions the Resolver finds pure off
+MEMO_LIMIT = 128
+
+# how many pairs of operand types a BinOpNode keeps the operation for, see InlineCache
+CACHE_LIMIT = 4
+
 class Number(Value):
     def __init__(self, value):
         super().__init__()
@@ -14,18 +29,24 @@ class Number(Value):
     def add(self, other):
         if isinstance(other, Number):
             return Number(self.value + other.value).set_Context(self.context), None
+        elif isinstance(other, Array):
+            return other.operate(self, operator.add, True)
         else:
             return None, Value.illegal_op(self, other)
         
     def sub(self, other):
         if isinstance(other, Number):
             return Number(self.value - other.value).set_Context(self.context), None
+        elif isinstance(other, Array):
+            return other.operate(self, operator.sub, True)
         else:
             return None, Value.illegal_op(self, other)
     
     def mul(self, other):
         if isinstance(other, Number):
             return Number(self.value * other.value).set_Context(self.context), None
+        elif isinstance(other, Array):
+            return other.operate(self, operator.mul, True)
         else:
             return None, Value.illegal_op(self, other)
     
@@ -37,48 +58,64 @@ class Number(Value):
                 start, end = other.get_Pos()
                 self.error = RTError("ZeroDivisionError", "Division By Zero" ,context=self.context, pos_start=start, pos_end=end)
                 return None, self.error
+        elif isinstance(other, Array):
+            return other.operate(self, operator.truediv, True)
         else:
             return None, Value.illegal_op(self, other)
 
     def pow(self, other):
         if isinstance(other, Number):
             return Number(self.value ** other.value).set_Context(self.context), None
+        elif isinstance(other, Array):
+            return other.operate(self, operator.pow, True)
         else:
             return None, Value.illegal_op(self, other)
 
     def compare_ee(self, other):
         if isinstance(other, Number):
             return Number(int(self.value == other.value)).set_Context(self.context), None
+        elif isinstance(other, Array):
+            return other.operate(self, operator.eq, True)
         else:
             return None, Value.illegal_op(self, other)
         
     def compare_ne(self, other):
         if isinstance(other, Number):
             return Number(int(self.value != other.value)).set_Context(self.context), None
+        elif isinstance(other, Array):
+            return other.operate(self, operator.ne, True)
         else:
             return None, Value.illegal_op(self, other)
         
     def compare_lt(self, other):
         if isinstance(other, Number):
             return Number(int(self.value < other.value)).set_Context(self.context), None
+        elif isinstance(other, Array):
+            return other.operate(self, operator.lt, True)
         else:
             return None, Value.illegal_op(self, other)
         
     def compare_gt(self, other):
         if isinstance(other, Number):
             return Number(int(self.value > other.value)).set_Context(self.context), None
+        elif isinstance(other, Array):
+            return other.operate(self, operator.gt, True)
         else:
             return None, Value.illegal_op(self, other)
         
     def compare_le(self, other):
         if isinstance(other, Number):
             return Number(int(self.value <= other.value)).set_Context(self.context), None
+        elif isinstance(other, Array):
+            return other.operate(self, operator.le, True)
         else:
             return None, Value.illegal_op(self, other)
         
     def compare_ge(self, other):
         if isinstance(other, Number):
             return Number(int(self.value >= other.value)).set_Context(self.context), None
+        elif isinstance(other, Array):
+            return other.operate(self, operator.ge, True)
         else:
             return None, Value.illegal_op(self, other)
 
@@ -185,37 +222,171 @@ class String(Value):
     def __repr__(self):
         return f'{self.value}'
 
+class Array(Value):
+    # a series of numbers, held in an array.array of 64-bit ints ('q') or of floats ('d'). Operators work element-wise, on two Arrays
+    # of the same length or on an Array and a Number, which goes with every element, and never make a Number for an element
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+
+    def operate(self, other, operation, reverse=False):
+        # self operation other, other operation self if reverse, for the Value method of operation
+        if isinstance(other, Array):
+            if len(other.value) != len(self.value):
+                left, right = (other, self) if reverse else (self, other)
+                return None, RTError(None, f"Array lengths differ ({len(left.value)} and {len(right.value)})", left.context, left.start_pos, right.end_pos)
+        elif not isinstance(other, Number):
+            return None, Value.illegal_op(self, other)
+
+        left, right = (other, self) if reverse else (self, other)
+        count = len(self.value)
+
+        if operation is operator.truediv and (0 in right.value if isinstance(right, Array) else right.value == 0):
+            start, end = right.get_Pos()
+            return None, RTError("ZeroDivisionError", "Division By Zero", left.context, start, end)
+
+        # ints stay ints, unless a result isn't one (a negative power). One that doesn't fit in 64 bits is an error, as floats would give
+        # another result than the same operation on Numbers
+        if operation is operator.truediv or not all(is_int(operand) for operand in (left, right)):
+            typecodes = ('d', )
+        else:
+            typecodes = ('q', 'd')
+
+        for typecode in typecodes:
+            try:
+                result = array(typecode, map(operation, elements(left, count), elements(right, count)))
+                break
+            except ZeroDivisionError:
+                start, end = right.get_Pos()
+                return None, RTError("ZeroDivisionError", "Division By Zero", left.context, start, end)
+            except OverflowError:
+                if typecode == 'q':
+                    return None, RTError("OverflowError", "Array element doesn't fit in 64 bits", left.context, left.start_pos, right.end_pos)
+                return None, Value.illegal_op(left, right)
+            except TypeError:
+                if typecode == 'd':
+                    return None, Value.illegal_op(left, right)
+
+        return Array(result).set_Context(left.context), None
+
+    def add(self, other):
+        return self.operate(other, operator.add)
+
+    def sub(self, other):
+        return self.operate(other, operator.sub)
+
+    def mul(self, other):
+        return self.operate(other, operator.mul)
+
+    def div(self, other):
+        return self.operate(other, operator.truediv)
+
+    def pow(self, other):
+        return self.operate(other, operator.pow)
+
+    def compare_ee(self, other):
+        return self.operate(other, operator.eq)
+
+    def compare_ne(self, other):
+        return self.operate(other, operator.ne)
+
+    def compare_lt(self, other):
+        return self.operate(other, operator.lt)
+
+    def compare_gt(self, other):
+        return self.operate(other, operator.gt)
+
+    def compare_le(self, other):
+        return self.operate(other, operator.le)
+
+    def compare_ge(self, other):
+        return self.operate(other, operator.ge)
+
+    def true_(self):
+        return len(self.value) > 0
+
+    def copy(self):
+        # the elements are never changed, a copy shares them
+        copy = Array(self.value)
+        copy.set_Pos(self.start_pos, self.end_pos)
+        copy.set_Context(self.context)
+        return copy
+
+    def __repr__(self):
+        return f"[{', '.join(map(str, self.value))}]"
+
+def elements(value, count):
+    # the numbers an operand of Array.operate() gives, an Array's own or a Number's count times
+    return value.value if isinstance(value, Array) else repeat(value.value, count)
+
+def is_int(value):
+    return value.value.typecode == 'q' if isinstance(value, Array) else type(value.value) is int
+
 class Function(Value):
-    def __init__(self, fn_name, main_node, args):
+    def __init__(self, fn_name, main_node, args, scope=None):
         super().__init__()
         self.name = fn_name or '<lambda>'
         self.main_node = main_node
         self.args = args
+        # the layout of the frame a call gets, from the Resolver, None for a dict-backed frame
+        self.scope = scope
+        # the results of its calls, for a pure function, see Memo
+        self.memo = None
 
     def execute(self, args):
-        interpreter = Interpreter()
-        new_context = Context(self.name, self.context, self.start_pos)
-        new_context.symbol_table = SymbolTable(new_context.origin.symbol_table)
-
+        # arity first, nothing is made for a call that fails it
         if len(args) > len(self.args):
             return None, RTError(None, f"{len(args) - len(self.args)} extra args passed to '{self.name}'", self.context, self.start_pos, self.end_pos)
         
         if len(args) < len(self.args):
             return None, RTError(None, f"{len(self.args) - len(args)} not enough args passed to '{self.name}'", self.context, self.start_pos, self.end_pos)
-        
-        for idx in range(len(args)):
-            arg = self.args[idx]
-            arg_val = args[idx]
-            arg_val.set_Context(new_context)
-            new_context.symbol_table.set(arg, arg_val)
-
-        value, error = interpreter.exec(self.main_node, new_context)
-        if error:
-            return None, error
-        return value, None
+
+        # the way the closures and vm backends call, which looks a pure function's result up in its Memo like Interpreter.call() does
+        key = None
+        memo = self.memo
+        if memo is not None and memo.active:
+            key = memo_key(args)
+            if key is not None and memo.valid(self):
+                value = memo.lookup(key, self, self.start_pos)
+                if value is not None:
+                    return value, None
+            else:
+                key = None
+
+        new_context = Context(self.name, self.context, self.start_pos)
+        new_context.symbol_table = SymbolTable(new_context.origin.symbol_table, self.scope)
+
+        if self.scope:
+            slots = new_context.symbol_table.slots
+            for slot, arg_val in zip(self.scope.arg_slots, args):
+                arg_val.set_Context(new_context)
+                slots[slot] = arg_val
+        else:
+            for idx in range(len(args)):
+                arg = self.args[idx]
+                arg_val = args[idx]
+                arg_val.set_Context(new_context)
+                new_context.symbol_table.set(arg, arg_val)
+
+        value, error = self.run(new_context)
+        if key is not None and not error:
+            memo.store(key, value, value.context is new_context)
+        return value, error
+
+    def run(self, context):
+        # runs the body, once the args are bound in context. A call the body ends in is left to Interpreter.call(), see TailCall
+        interpreter = Interpreter()
+        try:
+            value = interpreter.exec(self.main_node, context)
+            if type(value) is TailCall:
+                return interpreter.call(value.function, value.args, value.node), None
+        except RTException as exception:
+            return None, exception.error
+        return box(value, context, self.main_node), None
     
     def copy(self):
-        copy = Function(self.name, self.main_node, self.args)
+        copy = Function(self.name, self.main_node, self.args, self.scope)
+        copy.memo = self.memo
         copy.set_Context(self.context)
         copy.set_Pos(self.start_pos, self.end_pos)
         return copy
@@ -223,183 +394,808 @@ class Function(Value):
     def __repr__(self):
         return f"<function {self.name}>"
 
-Global_Symbol_Table = SymbolTable()
-Global_Symbol_Table.set(null, Number(0))
+class BuiltinFunction(Value):
+    # a function written in Python, run(function, args) with the Values it is called with, returning (value, error) like execute()
+    def __init__(self, fn_name, run):
+        super().__init__()
+        self.name = fn_name
+        self.run = run
+
+    def execute(self, args):
+        return self.run(self, args)
+
+    def copy(self):
+        copy = BuiltinFunction(self.name, self.run)
+        copy.set_Context(self.context)
+        copy.set_Pos(self.start_pos, self.end_pos)
+        return copy
+
+    def __repr__(self):
+        return f"<built-in function {self.name}>"
+
+class TailCall:
+    # what a call in tail position evaluates to: the call, for Interpreter.call() to make once the body it is in has returned, so a
+    # chain of tail calls runs in a loop, in constant Python stack however long it gets
+    __slots__ = ('function', 'args', 'node')
+
+    def __init__(self, function, args, node):
+        self.function = function
+        self.args = args
+        self.node = node
+
+class Memo:
+    # the results of a pure Function's calls, by their args, so a call with args it was already called with gives its result back
+    # without running the body. A function is pure when the Resolver found its body only computes with its args and calls functions
+    # (deps, their names) that are pure too, which valid() checks before every call, or when memoize() marked it. Only calls with
+    # number and string args that give a number or a string are kept, the limit least recently used, with the context and positions
+    # the result had, so errors it ends up in are the same. A function whose calls stop repeating, missing GIVE_UP times its limit in a
+    # row, stops being looked up, its results are dropped
+    GIVE_UP = 4
+
+    def __init__(self, limit, deps=None):
+        self.limit = limit
+        # None for a function memoize() marked, whose calls are trusted
+        self.deps = deps
+        # args key -> (type, value, context, pos_start, pos_end) of the result, context None for the context of the call itself
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # misses since the last hit, and whether calls are still looked up
+        self.streak = 0
+        self.active = True
+        # the Memos of the functions the results were worked out with, see valid()
+        self.bound = None
+
+    def valid(self, function):
+        # whether the results still hold: every function the body calls, and every one those call in turn, is still pure and the one
+        # the results were worked out with. They are looked up like the body would, and the results are dropped when any changed
+        if not self.deps:
+            return True
+
+        memos = [self]
+        stack = [function]
+        while stack:
+            function = stack.pop()
+            table = function.context.symbol_table if function.context else None
+            for name in function.memo.deps or ():
+                dep = table.get(name) if table else None
+                if not isinstance(dep, Function) or dep.memo is None:
+                    self.clear()
+                    return False
+                if all(memo is not dep.memo for memo in memos):
+                    memos.append(dep.memo)
+                    stack.append(dep)
+
+        if memos != self.bound:
+            self.clear()
+            self.bound = memos
+        return True
+
+    def clear(self):
+        self.results.clear()
+        self.bound = None
+
+    def lookup(self, key, function, call_start):
+        # the result of function's call with args key, made at call_start, as a new Value, None on a miss
+        result = self.results.get(key)
+        if result is None:
+            self.miss()
+            return None
+
+        self.hits += 1
+        self.streak = 0
+        self.results.move_to_end(key)
+        value_type, value, result_context, pos_start, pos_end = result
+        if result_context is None:
+            result_context = Context(function.name, function.context, call_start)
+        return value_type(value).set_Context(result_context).set_Pos(pos_start, pos_end)
+
+    def miss(self):
+        self.misses += 1
+        self.streak += 1
+        if self.streak > self.GIVE_UP * self.limit:
+            self.active = False
+            self.clear()
+
+    def store(self, key, value, own):
+        # keeps value, the result of the call with args key, own if it was made in the context of that call
+        if type(value) is Number or type(value) is String:
+            self.results[key] = (type(value), value.value, None if own else value.context, value.start_pos, value.end_pos)
+            if len(self.results) > self.limit:
+                self.results.popitem(last=False)
+
+def new_memo(deps):
+    # the Memo of a new function whose body calls deps, None for one that isn't pure (deps None) or when memos are off
+    return Memo(MEMO_LIMIT, deps) if deps is not None and MEMO_LIMIT else None
+
+def memo_key(args):
+    # the key of a call with args in Memo.results, None for args it can't be memoized with
+    key = []
+    for arg in args:
+        arg_type = type(arg)
+        if arg_type is int or arg_type is str:
+            key.append(arg)
+            continue
+
+        if arg_type is Number or arg_type is String:
+            arg = arg.value
+            arg_type = type(arg)
+
+        if arg_type is int or arg_type is str:
+            key.append(arg)
+        elif arg_type is float:
+            # 1 == 1.0 and 0.0 == -0.0, but results differ
+            key.append((float, arg.hex()))
+        else:
+            return None
+    return tuple(key)
+
+def memoize(name, limit=MEMO_LIMIT, context=None):
+    # marks the function name is bound to in context (the global one by default) as pure, so its calls are memoized whatever its body
+    # reads, and returns its Memo, for a function the Resolver can't tell is pure, one reading a global constant for instance
+    context = context or Global_Context
+    function = context.symbol_table.get(name)
+    if not isinstance(function, Function):
+        raise Exception(f"'{name}' is not a function")
+
+    function.memo = Memo(limit)
+    return function.memo
+
+# the built-in functions, a call's error is reported at the call, like a Function's wrong number of args
+def check_args(function, args, count, kind):
+    # the error for args that aren't count Values of type kind, None if they are
+    if len(args) > count:
+        return RTError(None, f"{len(args) - count} extra args passed to '{function.name}'", function.context, function.start_pos, function.end_pos)
+    if len(args) < count:
+        return RTError(None, f"{count - len(args)} not enough args passed to '{function.name}'", function.context, function.start_pos, function.end_pos)
+    for arg in args:
+        if not isinstance(arg, kind):
+            return RTError(None, f"'{function.name}' takes {'numbers' if kind is Number else 'an array'}", function.context, function.start_pos, function.end_pos)
+    return None
+
+def result(function, value):
+    return value.set_Context(function.context).set_Pos(function.start_pos, function.end_pos), None
+
+def builtin_array(function, args):
+    # array(1, 2, 3): an Array of its args
+    error = check_args(function, args, len(args), Number)
+    if error: return None, error
+
+    values = [arg.value for arg in args]
+    typecode = 'q' if all(type(value) is int for value in values) else 'd'
+    try:
+        return result(function, Array(array(typecode, values)))
+    except OverflowError:
+        if typecode == 'q':
+            return None, RTError("OverflowError", "Array element doesn't fit in 64 bits", function.context, function.start_pos, function.end_pos)
+    except TypeError:
+        pass
+    return None, RTError(None, f"'{function.name}' takes numbers", function.context, function.start_pos, function.end_pos)
+
+def builtin_range(function, args):
+    # range(start, end) or range(start, end, step): the numbers 'for i from start to end by step' counts through
+    error = check_args(function, args, min(max(len(args), 2), 3), Number)
+    if error: return None, error
+
+    start, end = args[0].value, args[1].value
+    step = args[2].value if len(args) == 3 else 1
+    if step == 0:
+        return None, RTError(None, "range step can't be 0", function.context, function.start_pos, function.end_pos)
+
+    if type(start) is int and type(end) is int and type(step) is int:
+        return result(function, Array(array('q', range(start, end, step))))
+
+    values = array('d')
+    idx = start
+    while (idx < end) if step > 0 else (idx > end):
+        values.append(idx)
+        idx += step
+    return result(function, Array(values))
+
+def reduction(reduce, empty_ok=True):
+    # a built-in that gives reduce(elements) of its one Array arg
+    def run(function, args):
+        error = check_args(function, args, 1, Array)
+        if error: return None, error
+
+        elements = args[0].value
+        if not elements and not empty_ok:
+            return None, RTError(None, f"'{function.name}' of an empty array", function.context, function.start_pos, function.end_pos)
+        return result(function, Number(reduce(elements)))
+    return run
+
+BUILTINS = {
+    'array': builtin_array,
+    'range': builtin_range,
+    'sum': reduction(sum),
+    'min': reduction(min, False),
+    'max': reduction(max, False),
+    'mean': reduction(lambda elements: sum(elements) / len(elements), False),
+}
+
+def global_context():
+    # a new context for programs to run in, with nil and the built-ins, and nothing any run stored, see Engine
+    context = Context('<program>')
+    context.symbol_table = SymbolTable()
+    context.symbol_table.set(null, Number(0))
+    for name, run in BUILTINS.items():
+        context.symbol_table.set(name, BuiltinFunction(name, run).set_Context(context))
+    return context
+
+# the context every program runs in unless it is given an Engine's, one for every run, so a value one run stores is still in the context
+# the next run reads it in
+Global_Context = global_context()
+Global_Symbol_Table = Global_Context.symbol_table
+
+# exec() returns numbers and strings unboxed, as the plain Python value a Number or String would hold: an int, float or complex, or a
+# str. A plain value stands for the Value exec() would have made, in the context it ran in and positioned at the node it just ran, so
+# no Number or String is made for a literal, a variable read or an operator unless an error needs its context and positions, or the
+# value outlives the node: it is stored in a variable, passed to or returned from a function, or handed up by an if or a statement
+# list as its own value. box() makes that Value. Bools, Functions and values made in another context stay Value objects throughout.
+NUMBER_TYPES = (int, float, complex)
+PLAIN_TYPES = (int, float, complex, str)
+
+# operator kind -> what the Number method for it computes, on plain values
+NUMBER_OPERATIONS = {
+    KINDS['+']: operator.add,
+    KINDS['-']: operator.sub,
+    KINDS['*']: operator.mul,
+    KINDS['/']: operator.truediv,
+    KINDS['^']: operator.pow,
+    KINDS['==']: lambda left, right: int(left == right),
+    KINDS['!=']: lambda left, right: int(left != right),
+    KINDS['<']: lambda left, right: int(left < right),
+    KINDS['>']: lambda left, right: int(left > right),
+    KINDS['<=']: lambda left, right: int(left <= right),
+    KINDS['>=']: lambda left, right: int(left >= right),
+    KINDS[KEYWORDS['AND']]: lambda left, right: int(left and right),
+    KINDS[KEYWORDS['OR']]: lambda left, right: int(left or right),
+}
+
+# (operator kind, right operand is a str) -> what the String method for it computes, every other operator is illegal on a str
+STRING_OPERATIONS = {
+    (KINDS['+'], True): operator.add,
+    (KINDS['*'], False): operator.mul,
+}
+
+class InlineCache:
+    # the operations a BinOpNode has run, by the types of its operands, so the next time it sees the same types it runs the operation
+    # without binop() working it out again. A site nearly always sees one pair, kept in last and checked first; every
+    # pair, up to CACHE_LIMIT, is kept in entries, and past that the site goes to binop() for any pair it hasn't kept. Numbers, plain
+    # or a Number (a variable read in a context other than the one it was set in), and plain strings get the operation binop() would
+    # end up running on their values; any other pair is kept with None and goes to binop(), like an operation that fails, so values
+    # and errors are the same. hits and misses count how often an operation was run and how often binop() was, see inline_caches().
+    # A tree can be run by many threads at once (an Incremental Document run on many Engines), so the last pair and its operation are
+    # one tuple, replaced in one store, and never read half updated; entries only ever gets pairs added. The counts may miss an update
+    __slots__ = ('last', 'entries', 'hits', 'misses')
+
+    def __init__(self):
+        # (left type, right type, operation) of the last pair
+        self.last = (None, None, None)
+        # (left type, right type) -> operation, None for binop()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, op, left_type, right_type):
+        # the operation for a pair other than the last one, which it becomes, kept the first time the site sees it
+        key = (left_type, right_type)
+        if key in self.entries:
+            operation = self.entries[key]
+        elif len(self.entries) < CACHE_LIMIT:
+            if (left_type in NUMBER_TYPES or left_type is Number) and (right_type in NUMBER_TYPES or right_type is Number):
+                operation = unboxed(NUMBER_OPERATIONS[op], left_type is Number, right_type is Number)
+            elif left_type is str and (right_type is str or right_type in NUMBER_TYPES):
+                operation = STRING_OPERATIONS.get((op, right_type is str))
+            else:
+                operation = None
+            self.entries[key] = operation
+        else:
+            return None
+
+        self.last = (left_type, right_type, operation)
+        return operation
+
+def unboxed(operation, left, right):
+    # operation on the .value of the operands that are a Number
+    if left and right:
+        return lambda left, right: operation(left.value, right.value)
+    if left:
+        return lambda left, right: operation(left.value, right)
+    if right:
+        return lambda left, right: operation(left, right.value)
+    return operation
+
+def inline_caches(node):
+    # (node, hits, misses) for every BinOpNode in the tree that has run, for seeing which sites see more than one pair of types. The
+    # tree is the one that ran: MainHandler.Execute runs a copy of the parsed tree, which only shares the caches the parsed tree
+    # already had before it was copied. Engine.inline_caches() gives them for every tree an Engine ran
+    from .Optimizer import CHILDREN
+
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if type(node) is BinOpNode and node.cache is not None:
+            yield node, node.cache.hits, node.cache.misses
+
+        for name in reversed(CHILDREN.get(type(node), ())):
+            value = getattr(node, name)
+            if type(value) is list:
+                for item in reversed(value):
+                    stack.extend(reversed(item) if type(item) is tuple else (item, ))
+            elif value is not None:
+                stack.append(value)
+
+def box(value, context, node):
+    # the Value a plain value returned by exec(node) stands for, any other value as it is
+    value_type = type(value)
+    if value_type is str:
+        return String(value).set_Context(context).set_Pos(node.pos_start, node.pos_end)
+    if value_type in NUMBER_TYPES:
+        return Number(value).set_Context(context).set_Pos(node.pos_start, node.pos_end)
+    return value
+
+def truthy(value):
+    # Value.true_() of a plain or boxed value
+    value_type = type(value)
+    if value_type is str:
+        return len(value) > 0
+    if value_type in NUMBER_TYPES:
+        return value != 0
+    return value.true_()
+
+def plain(value):
+    # the .value of a plain or boxed value, what a for loop counts with
+    return value if type(value) in PLAIN_TYPES else value.value
 
 class Interpreter:
+    # node type -> handle_<NodeName> function, filled in the first time exec() sees each node type
+    handlers = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.handlers = {}
+
+    def __init__(self):
+        self.depth = 0
+
     def exec(self, node, context):
-        method_name = f"handle_{type(node).__name__}"
-        method = getattr(self, method_name, self.no_hdl_method)
-        return method(node, context)
+        if self.depth > MAX_RECURSION:
+            return self.exec_deep(node, context)
+
+        handler = self.handlers.get(type(node)) or self.handler(node)
+        self.depth += 1
+        try:
+            return handler(self, node, context)
+        finally:
+            self.depth -= 1
+
+    def evaluate(self, node, context):
+        # exec() for code outside the Interpreter, which gets (value, error) back like from every other backend: a Value, never a plain
+        # value, or the RTError a handler raised
+        try:
+            value = self.exec(node, context)
+        except RTException as exception:
+            return None, exception.error
+        return box(value, context, node), None
+
+    def handler(self, node):
+        cls = type(self)
+        handler = cls.handlers[type(node)] = getattr(cls, f"handle_{type(node).__name__}", cls.no_hdl_method)
+        return handler
+
+    def exec_deep(self, node, context):
+        # exec() for trees nested deeper than MAX_RECURSION. Operators, calls and 'set' wait for their operands on an explicit stack
+        # instead of the Python stack, every other node goes to its handler as usual.
+        stack = []
+
+        while True:
+            # go down the left edge until a node that isn't waiting on an operand
+            node_type = type(node)
+            if node_type is BinOpNode:
+                stack.append((node, ))
+                node = node.left
+                continue
+            if node_type is UnaryOpNode:
+                stack.append((node, ))
+                node = node.node
+                continue
+            if node_type is VarAssignNode:
+                stack.append((node, ))
+                node = node.value_node
+                continue
+            if node_type is CallNode:
+                stack.append((node, ))
+                node = node.call_node
+                continue
+
+            handler = self.handlers.get(node_type) or self.handler(node)
+            value = handler(self, node, context)
+
+            # hand the value up until a node needs another operand evaluated
+            while stack:
+                frame = stack.pop()
+                node = frame[0]
+                node_type = type(node)
+
+                if node_type is BinOpNode:
+                    if len(frame) == 1:
+                        stack.append((node, value))
+                        node = node.right
+                        break
+                    value = self.binop(node, frame[1], value, context)
+
+                elif node_type is UnaryOpNode:
+                    value = self.unaryop(node, value, context)
+
+                elif node_type is VarAssignNode:
+                    value = box(value, context, node.value_node)
+                    self.bind(node, value, context)
+
+                else:
+                    if len(frame) == 1:
+                        frame = (node, box(value, context, node.call_node).copy().set_Pos(node.pos_start, node.pos_end), [])
+                    else:
+                        frame[2].append(box(value, context, node.arg_nodes[len(frame[2])]))
+
+                    if len(frame[2]) < len(node.arg_nodes):
+                        stack.append(frame)
+                        node = node.arg_nodes[len(frame[2])]
+                        break
+                    if type(frame[1]) is Function:
+                        value = self.call(frame[1], frame[2], node)
+                    else:
+                        value = self.execute(frame[1], frame[2], node)
+            else:
+                return value
     
     def no_hdl_method(self, node, context):
         raise Exception(f"No handle_{type(node).__name__} method defined")
     
     def handle_NumberNode(self, node, context):
-        return Number(node.tok[1]).set_Context(context).set_Pos(node.pos_start, node.pos_end), None
+        return node.value
 
     def handle_BoolNode(self, node, context):
-        return Bool(node.tok[1]).set_Context(context).set_Pos(node.pos_start, node.pos_end), None
+        return Bool(node.value).set_Context(context).set_Pos(node.pos_start, node.pos_end)
 
     def handle_StringNode(self, node, context):
-        return String(node.tok[1]).set_Context(context).set_Pos(node.pos_start, node.pos_end), None
+        return node.value
 
     def handle_BinOpNode(self, node, context):
-        left, error = self.exec(node.left, context)
-        if error: return None, error
+        left = self.exec(node.left, context)
+        right = self.exec(node.right, context)
 
-        right, error = self.exec(node.right, context)
-        if error: return None, error
+        cache = node.cache
+        if cache is None:
+            cache = node.cache = InlineCache()
+
+        left_type, right_type = type(left), type(right)
+        last = cache.last
+        if left_type is last[0] and right_type is last[1]:
+            operation = last[2]
+        else:
+            operation = cache.lookup(node.op, left_type, right_type)
 
-        if node.op[0] == TOKENS['+']:
+        if operation is None:
+            cache.misses += 1
+            return self.binop(node, left, right, context)
+
+        cache.hits += 1
+        try:
+            value = operation(left, right)
+        except ZeroDivisionError:
+            # binop() raises the RTError for a division by zero
+            return self.binop(node, left, right, context)
+
+        if left_type is Number:
+            # what Number's method makes, in the context of the left operand, a plain one stands for a Number in this context
+            return Number(value).set_Context(left.context).set_Pos(node.pos_start, node.pos_end)
+        return value
+
+    def binop(self, node, left, right, context):
+        left_type, right_type = type(left), type(right)
+
+        if left_type in NUMBER_TYPES:
+            if right_type in NUMBER_TYPES:
+                if node.op == KINDS['/'] and right == 0:
+                    raise RTException(RTError("ZeroDivisionError", "Division By Zero", context, node.right.pos_start, node.right.pos_end))
+                return NUMBER_OPERATIONS[node.op](left, right)
+            if right_type is str:
+                raise RTException(RTError(None, 'Illegal operation', context, node.left.pos_start, node.right.pos_end))
+
+        elif left_type is str:
+            if right_type is str or right_type in NUMBER_TYPES:
+                operation = STRING_OPERATIONS.get((node.op, right_type is str))
+                if operation:
+                    return operation(left, right)
+                raise RTException(RTError(None, 'Illegal operation', context, node.left.pos_start, node.right.pos_end))
+
+        # a Bool, a Function or a value from another context on either side, the Value methods work it out
+        left = box(left, context, node.left)
+        right = box(right, context, node.right)
+
+        if node.op == KINDS['+']:
             result, error = left.add(right)
-        elif node.op[0] == TOKENS['-']:
+        elif node.op == KINDS['-']:
             result, error = left.sub(right)
-        elif node.op[0] == TOKENS['*']:
+        elif node.op == KINDS['*']:
             result, error = left.mul(right)
-        elif node.op[0] == TOKENS['/']:
+        elif node.op == KINDS['/']:
             result, error = left.div(right)
-        elif node.op[0] == TOKENS['^']:
+        elif node.op == KINDS['^']:
             result, error = left.pow(right)
-        elif node.op[0] == TOKENS['==']:
+        elif node.op == KINDS['==']:
             result, error = left.compare_ee(right)
-        elif node.op[0] == TOKENS['!=']:
+        elif node.op == KINDS['!=']:
             result, error = left.compare_ne(right)
-        elif node.op[0] == TOKENS['<']:
+        elif node.op == KINDS['<']:
             result, error = left.compare_lt(right)
-        elif node.op[0] == TOKENS['>']:
+        elif node.op == KINDS['>']:
             result, error = left.compare_gt(right)
-        elif node.op[0] == TOKENS['<=']:
+        elif node.op == KINDS['<=']:
             result, error = left.compare_le(right)
-        elif node.op[0] == TOKENS['>=']:
+        elif node.op == KINDS['>=']:
             result, error = left.compare_ge(right)
-        elif node.op[0] == TOKENS['key'] and node.op[1] == KEYWORDS['AND']:
+        elif node.op == KINDS[KEYWORDS['AND']]:
             result, error = left.and_(right)
-        elif node.op[0] == TOKENS['key'] and node.op[1] == KEYWORDS['OR']:
+        elif node.op == KINDS[KEYWORDS['OR']]:
             result, error = left.or_(right)
 
-        if error:
-            return None, error
-        else:
-            return result.set_Pos(node.pos_start, node.pos_end), None
+        if error: raise RTException(error)
+        return result.set_Pos(node.pos_start, node.pos_end)
 
     def handle_UnaryOpNode(self, node, context):
-        number, error = self.exec(node.node, context)
-        if error: return None, error
+        number = self.exec(node.node, context)
+        return self.unaryop(node, number, context)
 
-        if node.op[0] == TOKENS['-']:
+    def unaryop(self, node, number, context):
+        if type(number) in PLAIN_TYPES:
+            if node.op == KINDS['-']:
+                return number * -1
+            if node.op == KINDS[KEYWORDS['NOT']]:
+                if type(number) is str:
+                    raise RTException(RTError(None, 'Illegal operation', context, node.node.pos_start, node.node.pos_end))
+                return 1 if number == 0 else 0
+            return number
+
+        error = None
+        if node.op == KINDS['-']:
             number, error = number.mul(Number(-1))
-        elif node.op[0] == TOKENS['key'] and node.op[1] == KEYWORDS['NOT']:
+        elif node.op == KINDS[KEYWORDS['NOT']]:
             number, error = number.not_()
 
-        if error:
-            return None, error
-        else:
-            return number.set_Pos(node.pos_start, node.pos_end), None
+        if error: raise RTException(error)
+        return number.set_Pos(node.pos_start, node.pos_end)
         
     def handle_VarAccessNode(self, node, context):
-        var = node.var_tok[1]
-        value = context.symbol_table.get(var)
+        var = node.var_name
+        symbol_table = context.symbol_table
+        depth = node.depth
+        if depth is None or not symbol_table.lexical:
+            value = symbol_table.get(var)
+        elif depth == 0:
+            # one of the function's own names, which always has a slot
+            value = symbol_table.slots[node.slot]
+            if value is None:
+                value = symbol_table.get(var)
+        else:
+            value = symbol_table.lookup(depth, node.slot, var)
 
         if not value:
-            error = RTError("RuntimeError", f"{var} is not defined", context, node.pos_start, node.pos_end)
-            return None, error
-        
-        value = value.copy().set_Pos(node.pos_start, node.pos_end)
-        return value, None
+            raise RTException(RTError("RuntimeError", f"{var} is not defined", context, node.pos_start, node.pos_end))
+
+        if value.context is context and (type(value) is Number or type(value) is String):
+            # read in the context it was made in, the plain value stands for the copy, with no need to make it
+            return value.value
+
+        return value.copy().set_Pos(node.pos_start, node.pos_end)
     
     def handle_VarAssignNode(self, node, context):
-        var = node.var_tok[1]
-        value, error = self.exec(node.value_node, context)
-        if error: return None, error
+        var = node.var_name
+        value = self.exec(node.value_node, context)
 
+        value = box(value, context, node.value_node)
+        if node.slot is None:
+            context.symbol_table.set(var, value)
+        else:
+            context.symbol_table.slots[node.slot] = value
+        return value
 
-        context.symbol_table.set(var, value)
-        return value, None
+    def bind(self, node, value, context):
+        # stores value under the name a 'set', 'for' or 'fn' node binds, in the slot the Resolver gave it if it has one
+        if node.slot is None:
+            context.symbol_table.set(node.var_name, value)
+        else:
+            context.symbol_table.slots[node.slot] = value
 
     def handle_IfStatementNode(self, node, context):
         for check, expr in node.cases:
-            check_result, error = self.exec(check, context)
-            if error: return None, error
-
-            if check_result.true_():
-                expr_result, error = self.exec(expr, context)
-                if error: return None, error
-                return expr_result, error
+            if truthy(self.exec(check, context)):
+                return box(self.exec(expr, context), context, expr)
             
         if node.else_case:
-            else_result, error = self.exec(node.else_case, context)
-            if error: return None, error
-            return else_result, error
+            return box(self.exec(node.else_case, context), context, node.else_case)
 
-        return None, None
+        return None
 
     def handle_ForStatementNode(self, node, context):
-        start_val, error = self.exec(node.start_node, context)
-        if error: return None, error
-
-        end_val, error = self.exec(node.end_node, context)
-        if error: return None, error
+        start_val = self.exec(node.start_node, context)
+        end_val = self.exec(node.end_node, context)
 
         if node.step_node:
-            step_val, error = self.exec(node.step_node, context)
-            if error: return None, error
+            step_val = self.exec(node.step_node, context)
         else:
             step_val = Number(1)
 
-        idx = start_val.value
+        idx = plain(start_val)
+        end = plain(end_val)
+        step = plain(step_val)
 
-        if step_val.value >= 0:
-            check = lambda: idx < end_val.value
-        else:
-            check = lambda: idx > end_val.value
+        # the loop variable is one Number, bound once and counted on in place: reading it always copies it (it has no context), so
+        # nothing holds on to it, and it is bound again only when the body sets the name to something else
+        counter = Number(idx)
+        symbol_table = context.symbol_table
+        var, slot = node.var_name, node.slot
+        main_node = node.main_node
+        # the body's handler is looked up once and called directly, at the depth exec() would run it at
+        handler = self.loop_handler(main_node)
 
-        while check():
-            context.symbol_table.set(node.var_tok[1], Number(idx))
-            idx += step_val.value
+        self.depth += 1
+        try:
+            if step >= 0:
+                while idx < end:
+                    counter.value = idx
+                    if slot is None:
+                        symbol_table.set(var, counter)
+                    elif symbol_table.slots[slot] is not counter:
+                        symbol_table.slots[slot] = counter
+                    idx += step
 
-            _, error = self.exec(node.main_node, context)
-            if error: return None, error
+                    handler(self, main_node, context)
+            else:
+                while idx > end:
+                    counter.value = idx
+                    if slot is None:
+                        symbol_table.set(var, counter)
+                    elif symbol_table.slots[slot] is not counter:
+                        symbol_table.slots[slot] = counter
+                    idx += step
 
-        return None, None
-    
-    def handle_WhileStatementNode(self, node, context):
-        while True:
-            check, error = self.exec(node.check_node, context)
-            if error: return None, error
+                    handler(self, main_node, context)
+        finally:
+            self.depth -= 1
 
-            if not check.true_(): break
+        return None
+    
+    def loop_handler(self, node):
+        # what a for loop calls, as handler(self, node, context), to run its body node each time round
+        if self.depth > MAX_RECURSION:
+            return type(self).exec
+        return self.handlers.get(type(node)) or self.handler(node)
 
-            _, error = self.exec(node.main_node, context)
-            if error: return None, error
+    def handle_WhileStatementNode(self, node, context):
+        while truthy(self.exec(node.check_node, context)):
+            self.exec(node.main_node, context)
 
-        return None, None
+        return None
 
     def handle_FuncDefNode(self, node, context):
-        func = node.var_tok[1] if node.var_tok else None
+        func = node.var_name
         main_node = node.main_node
-        args = [arg[1] for arg in node.arg_toks]
-        func_val = Function(func, main_node, args).set_Context(context).set_Pos(node.pos_start, node.pos_end)
+        args = node.arg_names
+        func_val = Function(func, main_node, args, node.scope).set_Context(context).set_Pos(node.pos_start, node.pos_end)
+        func_val.memo = new_memo(node.deps)
+        # calls of it get frames whose parent is this one, which can't go back to a pool
+        context.symbol_table.captured = True
 
-        if node.var_tok:
-            context.symbol_table.set(func, func_val)
+        if node.var_name:
+            self.bind(node, func_val, context)
 
-        return func_val, None
+        return func_val
     
     def handle_CallNode(self, node, context):
         args = []
 
-        call_val, error = self.exec(node.call_node, context)
-        if error: return None, error
+        call_val = self.exec(node.call_node, context)
+
+        if type(call_val) is Function:
+            for arg_node in node.arg_nodes:
+                args.append(self.exec(arg_node, context))
+
+            if node.tail:
+                return TailCall(call_val, args, node)
+            return self.call(call_val, args, node)
 
-        call_val = call_val.copy().set_Pos(node.pos_start, node.pos_end)
+        call_val = box(call_val, context, node.call_node).copy().set_Pos(node.pos_start, node.pos_end)
 
         for arg_node in node.arg_nodes:
-            arg, error = self.exec(arg_node, context)
-            args.append(arg)
-            if error: return None, error
+            args.append(box(self.exec(arg_node, context), context, arg_node))
 
-        return_val, error = call_val.execute(args)
-        if error: return None, error
-        return return_val, None
+        return self.execute(call_val, args, node)
+
+    def execute(self, function, args, node):
+        # a call of anything but a Function, a BuiltinFunction or a Function of another backend, with args boxed and function copied to
+        # the call, like Function.execute() gets them
+        value, error = function.execute(args)
+        if error: raise RTException(error)
+        return value
+
+    def call(self, function, args, node):
+        # Function.execute() for a Function the CallNode node calls with args, as exec() returned them, and for every call its body ends
+        # in. The Function isn't copied to put it at the call, its frame comes from its Scope's pool when there is one there, and the
+        # body runs on this Interpreter, with the depth a new one would start at. A pure function's result is looked up in its Memo first
+        # and kept there after, along with the result of every call of one in the tail calls that led to it
+        pending = None
+        while True:
+            if len(args) != len(function.args):
+                if len(args) > len(function.args):
+                    message = f"{len(args) - len(function.args)} extra args passed to '{function.name}'"
+                else:
+                    message = f"{len(function.args) - len(args)} not enough args passed to '{function.name}'"
+                raise RTException(RTError(None, message, function.context, node.pos_start, node.pos_end))
+
+            entry = None
+            memo = function.memo
+            if memo is not None and memo.active:
+                key = memo_key(args)
+                if key is not None and memo.valid(function):
+                    value = memo.lookup(key, function, node.pos_start)
+                    if value is not None:
+                        for call in pending or ():
+                            call[0].store(call[1], value, False)
+                        return value
+
+                    entry = (memo, key)
+                    pending = pending or []
+                    pending.append(entry)
+
+            new_context = Context(function.name, function.context, node.pos_start)
+            scope = function.scope
+            if scope and scope.frames:
+                symbol_table = scope.frames.pop()
+                symbol_table.reset(function.context.symbol_table)
+            else:
+                symbol_table = SymbolTable(function.context.symbol_table, scope)
+            new_context.symbol_table = symbol_table
+
+            for idx, arg in enumerate(args):
+                if type(arg) in PLAIN_TYPES:
+                    arg = box(arg, new_context, node.arg_nodes[idx])
+                else:
+                    arg.set_Context(new_context)
+                    if isinstance(arg, Function):
+                        symbol_table.captured = True
+
+                if scope:
+                    symbol_table.slots[scope.arg_slots[idx]] = arg
+                else:
+                    symbol_table.set(function.args[idx], arg)
+
+            depth, self.depth = self.depth, 0
+            try:
+                value = self.exec(function.main_node, new_context)
+            finally:
+                self.depth = depth
+
+                if scope and not symbol_table.captured:
+                    # no Function holds on to the frame, nothing will look a name up in it again
+                    new_context.symbol_table = None
+                    symbol_table.clear()
+                    scope.frames.append(symbol_table)
+
+            if type(value) is not TailCall:
+                value = box(value, new_context, function.main_node)
+                if pending:
+                    # only the result of this call was made in its own context, the others' contexts are where they made their tail calls
+                    for call in pending:
+                        call[0].store(call[1], value, call is entry and value.context is new_context)
+                return value
+            function, args, node = value.function, value.args, value.node
+
+    def handle_StatementsNode(self, node, context):
+        # only the last statement's value is kept
+        value = None
+        for statement in node.statement_nodes:
+            value = self.exec(statement, context)
 
+        return box(value, context, statement)
@@ -3,10 +3,12 @@
 # This is the first part of this language, it takes in the raw text and converts it into seperate tokens, (You can find all the supported tokens in TOKENS dictionary) and handles IllegalCharacter error and Some Syntax error too.
 # =====================================================================================================================================
 
+import re
 import string
+from array import array
 
 from .ErrorHandler import IllegalCharacter_, SyntaxError_
-from . import Position
+from .Position import Position, Source
 
 # TOKENS
 TOKENS = {
@@ -26,6 +28,7 @@ TOKENS = {
     '>': "GT",
     '->': "FNARROW",
     ',': "SEP",
+    ';': "SEMI",
     'bool': "BOOL",
     'key': "KEY",
     'int': "INT",
@@ -58,154 +61,172 @@ NUMBERS = string.digits
 LETTERS = string.ascii_letters
 NUM_LET = NUMBERS + LETTERS + '_'
 
+BOOL_SET = frozenset((KEYWORDS['TRUE'], KEYWORDS['FALSE']))
+
+# Compact token kinds for the TokenBuffer, one small int per TOKENS entry and one per keyword (true and false share TOKENS['bool']).
+# KIND_NAMES maps a kind back to the TOKENS name it is shown as, so every keyword kind still reads as "KEY".
+# KIND_SYMBOLS maps it back to its key in KINDS, which for operators and keywords is also the token's text.
+KINDS = {}
+KIND_NAMES = []
+KIND_SYMBOLS = []
+for symbol, name in TOKENS.items():
+    KINDS[symbol] = len(KIND_NAMES)
+    KIND_NAMES.append(name)
+    KIND_SYMBOLS.append(symbol)
+WORD_KINDS = {}
+for keyword in KEYWORDS.values():
+    if keyword in BOOL_SET:
+        WORD_KINDS[keyword] = KINDS['bool']
+    else:
+        WORD_KINDS[keyword] = KINDS[keyword] = len(KIND_NAMES)
+        KIND_NAMES.append(TOKENS['key'])
+        KIND_SYMBOLS.append(keyword)
+
+ESCAPES = {
+    'n': "\n",
+    't': "\t",
+    '\\': "\\",
+    "'": "\'",
+    '"': "\""
+}
+
+# Master pattern, matched back to back over the whole text: leading whitespace, then exactly one of
+# number | identifier | operator | string literal | any other single character.
+# The last group only ever catches '.', '_', unterminated quotes and illegal characters, which all end lexing with an error.
+TOKEN_RE = re.compile(r"""
+    (\s*)
+    (?:
+        ([0-9]*\.[0-9]+|[0-9]+)
+      | ([A-Za-z][A-Za-z0-9_]*)
+      | (->|[<>=!]=|[-+*/()^=<>,;])
+      | ("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (\S)
+    )
+""", re.VERBOSE | re.DOTALL)
+ESCAPE_RE = re.compile(r'\\(.)', re.DOTALL)
+ILLEGAL_RE = re.compile('[^' + re.escape(NUM_LET + '. \t\n' + ''.join(t for t in TOKENS if len(t) == 1)) + ']*')
+
+def unescape(match):
+    return ESCAPES.get(match.group(1), match.group(1))
+
+class TokenBuffer:
+    # struct-of-arrays token stream: kinds as small ints, start/end as offsets into src.text, values sliced out only when asked for
+    def __init__(self, src):
+        self.src = src
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def value(self, idx):
+        kind = self.kinds[idx]
+        text = self.src.text[self.starts[idx]:self.ends[idx]]
+
+        if kind == KINDS['int']:
+            return int(text)
+        if kind == KINDS['float']:
+            return float(text)
+        if kind == KINDS['str']:
+            text = text[1:-1]
+            return ESCAPE_RE.sub(unescape, text) if '\\' in text else text
+        if kind == KINDS['eof']:
+            return None
+        return text
+
+    def token(self, idx):
+        # the classic (kind, value, (pos_start, pos_end)) tuple, for debugging and tools, the parser never builds it
+        return (KIND_NAMES[self.kinds[idx]], self.value(idx), (Position(self.starts[idx], self.src), Position(self.ends[idx], self.src)))
+
 class Lexer:
     def __init__(self, fn, text):
         self.fn = fn
         self.text = text
-        self.pos = Position.Position(0, 0, 0, fn, text)
-        self.tokens = []
-        self.current_char = None
+        self.src = Source(fn, text)
+        self.tokens = TokenBuffer(self.src)
         self.error = None
-        self.keyword_vals = KEYWORDS.values()
-    
-    def number_lex(self):
-        num = ''
-        dot_count = 0
-        pos_start = self.pos.copy()
-        
-        while self.pos.idx < len(self.text) and self.text[self.pos.idx] in NUMBERS + '.':
-            self.current_char = self.text[self.pos.idx]
-            if dot_count == 1 and self.current_char == '.':
-                self.pos.advance(self.current_char)
-                pos_end = self.pos.copy()
-                self.error = SyntaxError_("multiple decimal points", pos_start=pos_start, pos_end=pos_end)
-                return
-            elif self.current_char == '.':
-                next_char = self.pos.peek()
-                if next_char is None or next_char not in NUMBERS:
-                    self.pos.advance(self.current_char)
-                    self.error = SyntaxError_("invalid syntax", pos_start=pos_start, pos_end=self.pos)
-                    return
-                dot_count += 1
-            num += self.text[self.pos.idx]
-            self.pos.advance(self.current_char)
-        
-        if dot_count == 1:
-            self.tokens.append((TOKENS['float'], float(num), (pos_start, self.pos)))
-        else:
-            self.tokens.append((TOKENS['int'], int(num), (pos_start, self.pos)))
-
-    def string_lex(self):
-        str_val = ''
-        pos_start = self.pos.copy()
-        escape = False
-        quote = self.current_char
-        self.pos.advance()
-        escape_lst = {
-            'n': "\n",
-            't': "\t",
-            '\\': "\\",
-            "'": "\'",
-            '"': "\""
-        }
-
-        while self.pos.idx < len(self.text):
-            self.current_char = self.text[self.pos.idx]
-            if self.current_char == quote and not escape:
-                break
 
-            if escape:
-                str_val += escape_lst.get(self.current_char, self.current_char)
-                escape = False
-            elif self.current_char == '\\':
-                escape = True
-            else:
-                str_val += self.current_char
-
-            self.pos.advance(self.current_char)
-
-        if self.pos.idx >= len(self.text):
-            self.error = SyntaxError_("Unterminated string", pos_start=pos_start, pos_end=self.pos)
-            return
-
-        self.pos.advance(self.current_char)
-        self.tokens.append((TOKENS['str'], str_val, (pos_start, self.pos)))
-
-    def identifier_lex(self):
-        ident = ''
-        pos_start = self.pos.copy()
-        
-        if self.text[self.pos.idx] == '_':
-            self.pos.advance(self.current_char)
-            self.error = SyntaxError_("variable cannot begin with '_'", pos_start=pos_start, pos_end=self.pos)
-            return
-
-        while self.pos.idx < len(self.text) and self.text[self.pos.idx] in NUM_LET:
-            self.current_char = self.text[self.pos.idx]
-            ident += self.text[self.pos.idx]
-            self.pos.advance(self.current_char)
-
-        if ident in self.keyword_vals:
-            if ident in (KEYWORDS['TRUE'], KEYWORDS['FALSE']):
-                self.tokens.append((TOKENS['bool'], ident, (pos_start, self.pos)))
-            else:
-                self.tokens.append((TOKENS['key'], ident, (pos_start, self.pos)))
-        else:
-            self.tokens.append((TOKENS['var'], ident, (pos_start, self.pos)))
-
-    def tokenize(self):
-        while self.pos.idx < len(self.text):
-            self.current_char = self.text[self.pos.idx]
-            
-            if self.current_char.isspace():
-                self.pos.advance(self.current_char)
-                continue
-
-            if self.current_char in NUMBERS + '.':
-                self.number_lex()
-                if self.error:
+    def tokenize(self, errors=None):
+        # with an errors list, lexing doesn't stop at the first error but records every one in it and lexes on past them
+        tokens = self.tokens
+        kinds = tokens.kinds.append
+        starts = tokens.starts.append
+        ends = tokens.ends.append
+
+        for kind, start, end in self.generate(errors=errors):
+            kinds(kind)
+            starts(start)
+            ends(end)
+        return tokens, self.error
+
+    def generate(self, start=0, errors=None):
+        # yields (kind, start, end) for every token from offset start on, which must be a token boundary
+        text = self.text
+        src = self.src
+        idx = start
+
+        while True:
+            for ws, num, ident, op, str_lit, other in map(re.Match.groups, TOKEN_RE.finditer(text, idx)):
+                if ws:
+                    idx += len(ws)
+
+                if op:
+                    end = idx + len(op)
+                    yield KINDS[op], idx, end
+                    idx = end
+                    continue
+
+                if ident:
+                    end = idx + len(ident)
+                    yield WORD_KINDS.get(ident, KINDS['var']), idx, end
+                    idx = end
+                    continue
+
+                if num:
+                    end = idx + len(num)
+                    if text.startswith('.', end):
+                        message = "multiple decimal points" if '.' in num else "invalid syntax"
+                        self.error = SyntaxError_(message, pos_start=Position(idx, src), pos_end=Position(end + 1, src))
+                        idx = end + 1
+                        break
+                    yield KINDS['float'] if '.' in num else KINDS['int'], idx, end
+                    idx = end
+                    continue
+
+                if str_lit:
+                    end = idx + len(str_lit)
+                    yield KINDS['str'], idx, end
+                    idx = end
+                    continue
+
+                pos_start = Position(idx, src)
+
+                if other == '.':
+                    idx += 1
+                    self.error = SyntaxError_("invalid syntax", pos_start=pos_start, pos_end=Position(idx, src))
                     break
-                continue
 
-            if self.current_char in LETTERS + "_":
-                self.identifier_lex()
-                continue
+                if other == '_':
+                    idx += 1
+                    self.error = SyntaxError_("variable cannot begin with '_'", pos_start=pos_start, pos_end=Position(idx, src))
+                    break
 
-            if self.current_char in ('"', '\''):
-                self.string_lex()
-                if self.error:
+                if other in ('"', '\''):
+                    idx = len(text)
+                    self.error = SyntaxError_("Unterminated string", pos_start=pos_start, pos_end=Position(idx, src))
                     break
-                continue
-
-            if self.current_char in ('<', '>', '=', '!', '-'):
-                pos_start = self.pos.copy()
-                token = self.current_char
-                next_char = self.pos.peek()
-                if next_char and token + next_char in TOKENS:
-                    token += next_char
-                    self.pos.advance(self.current_char)
-                self.pos.advance(self.current_char)
-                self.tokens.append((TOKENS[token], token, (pos_start, self.pos)))
-                continue
-
-            if self.current_char in TOKENS:
-                pos_start = self.pos.copy()
-                token = self.current_char
-                self.pos.advance(self.current_char)
-                self.tokens.append((TOKENS[token], token, (pos_start, self.pos)))
-                continue
-
-            pos_start = self.pos.copy()
-            illegal_str = self.current_char
-            self.pos.advance(self.current_char)
-
-            while self.pos.idx < len(self.text) and self.text[self.pos.idx] not in (NUMBERS + '.' + LETTERS + '_' + ' \t\n') and self.text[self.pos.idx] not in TOKENS:
-                illegal_str += self.text[self.pos.idx]
-                self.pos.advance(self.text[self.pos.idx])
-
-            pos_end = self.pos.copy()
-            self.error = IllegalCharacter_(f"'{illegal_str}'", pos_start=pos_start, pos_end=pos_end)
-            break
-        
-        self.tokens.append((TOKENS['eof'], None, (self.pos.copy(), self.pos.copy())))
-        return self.tokens, self.error
\ No newline at end of file
+
+                idx = ILLEGAL_RE.match(text, idx + 1).end()
+                self.error = IllegalCharacter_(f"'{text[pos_start.idx:idx]}'", pos_start=pos_start, pos_end=Position(idx, src))
+                break
+            else:
+                idx = len(text)
+                break
+
+            if errors is None:
+                break
+            # skip what the error covered and carry on from the end of it
+            errors.append(self.error)
+
+        yield KINDS['eof'], idx, idx
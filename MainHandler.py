@@ -1,22 +1,120 @@
+import mmap
+import os
+
 from . import Lexer
 from . import Parser
 from . import Interpreter
-from . import Context
+from . import Cache
+from . import Optimizer
+from . import Resolver
+from . import Closures
+from . import Bytecode
+from . import Transpiler
+from . import Governor
+from . import Engine
+
+# what runs the program: 'interpreter' walks the tree, 'closures' compiles it to closures first (see Closures), 'vm' to bytecode (see Bytecode),
+# 'python' to Python code (see Transpiler)
+BACKEND = 'interpreter'
+
+def Run(fn, source, limits=None, engine=None):
+    # runs every statement and returns only the last one's value (or the first error), see RunStatements for all of them.
+    # a program read from a file whose source hasn't changed since it was last run is loaded from its Cache file instead of parsed.
+    # a run given Governor.Limits is stopped with a LimitError_ once it goes over any of them. It runs in the globals of engine, an
+    # Engine.Engine, or of Engine.DEFAULT
+    interpreter = Governor.Governor(limits) if limits else None
+
+    node = Cache.load(fn, source)
+    if node is not None:
+        return Execute(node, interpreter, engine)
+
+    # programs that get cached have to keep every statement's node until the end, everything else lets them go once they've run
+    nodes = [] if Cache.cache_path(fn) is not None else None
+    result = None
+
+    for node, error in Statements(fn, source):
+        if error: return None, error
+
+        result, error = Execute(node, interpreter, engine)
+        if error: return None, error
+
+        if nodes is not None:
+            nodes.append(node)
+
+    if nodes:
+        Cache.store(fn, source, nodes[0] if len(nodes) == 1 else Parser.StatementsNode(nodes))
+
+    return result, None
 
-def Run(fn, source):
+def RunStatements(fn, source, limits=None, engine=None):
+    # yields (value, error) for each top-level statement, running it as soon as it is parsed, and stops after the first error
+    interpreter = Governor.Governor(limits) if limits else None
+
+    for node, error in Statements(fn, source):
+        if error:
+            yield None, error
+            return
+
+        result, error = Execute(node, interpreter, engine)
+        yield result, error
+        if error: return
+
+def Statements(fn, source):
+    # yields (node, error) for each top-level statement as the parser finishes it, a lexer error stops the program before it starts
     lexer = Lexer.Lexer(fn, source)
     tokens, error = lexer.tokenize()
-
-    if error: return None, error
+    if error:
+        yield None, error
+        return
 
     parser = Parser.Parser(tokens)
-    ast = parser.parse()
+    for ast in parser.statements():
+        yield ast.node, ast.error
+
+def RunDocument(document, limits=None, engine=None):
+    # runs an Incremental.Document, so a REPL or editor only pays for re-parsing what its last edit() touched
+    if document.error: return None, document.error
+
+    return Execute(document.ast.node, Governor.Governor(limits) if limits else None, engine)
+
+def Execute(node, interpreter=None, engine=None):
+    # the tree is optimized on every run rather than cached, so a Cache file or Document always holds the tree as parsed.
+    # interpreter is the Governor of a run with limits, which always runs on it. The node runs holding engine's lock, see Engine, which
+    # keeps the tree that ran when it records them
+    if Optimizer.ENABLED:
+        node = Optimizer.optimize(node) if interpreter is None else interpreter.optimize(node)
+
+    engine = engine or Engine.DEFAULT
+    context = engine.context
+
+    with engine.lock:
+        if interpreter is not None:
+            node = Resolver.resolve(node)
+            result, error = interpreter.evaluate(node, context)
+        elif BACKEND == 'closures':
+            result, error = Closures.compile(node)(context)
+        elif BACKEND == 'vm':
+            result, error = Bytecode.VM().run(Bytecode.compile(node), context)
+        elif BACKEND == 'python':
+            node = Resolver.resolve(node)
+            result, error = Transpiler.transpile(node)(context)
+        else:
+            node = Resolver.resolve(node)
+            interpreter = Interpreter.Interpreter()
+            result, error = interpreter.evaluate(node, context)
+
+        if engine.record:
+            engine.trees.append(node)
 
-    if ast.error: return None, ast.error
+    return result, error
 
-    interpreter = Interpreter.Interpreter()
-    context = Context.Context('<program>')
-    context.symbol_table = Interpreter.Global_Symbol_Table
-    result, error = interpreter.exec(ast.node, context)
+def RunFile(path, limits=None, engine=None):
+    with open(path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            source = ''
+        else:
+            # decode straight out of the mapping, the file is never copied into a bytes object first
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                source = str(mapped, 'utf-8')
 
-    return result, error
\ No newline at end of file
+    return Run(path, source, limits, engine)
@@ -0,0 +1,184 @@
+# Optimizer.py
+# =====================================================================================================================================
+# Optional pass between Parser.parse and Interpreter.exec that does ahead of time the work that doesn't depend on anything the program
+# does at runtime, so it isn't redone every time a node is executed, which inside a for/while body or a function is every iteration.
+#  - a BinOpNode or UnaryOpNode whose operands are all literals is folded into the literal it evaluates to: (10 + 5) * 2 - 3 -> 27
+#  - IfStatementNode cases whose condition is a literal are dropped when it is false, and when it is true they become the else case
+#    and every case after them is dropped, so an if whose branch is known in advance is replaced by that branch
+# Folding evaluates with the Interpreter's own binop()/unaryop() and Value classes, so the literal holds exactly the value exec() would
+# have produced, and it keeps the span of the node it replaces, so positions in errors and tracebacks don't change. Anything that
+# fails, division by zero, an illegal operation or a Python error, is left as it is, to be reported at runtime just like before.
+# Nodes are never modified, a node with a changed child is copied, so a tree shared with Cache or an Incremental Document is safe to
+# optimize. Subtrees nested deeper than MAX_RECURSION are left unoptimized, so the walk never runs out of Python stack on a tree
+# that only Parser.parse_deep and Interpreter.exec_deep can handle.
+# Setting ENABLED to False turns the optimizer off.
+# =====================================================================================================================================
+
+from .Parser import (NumberNode, BoolNode, StringNode, BinOpNode, UnaryOpNode, VarAssignNode, IfStatementNode,
+                     ForStatementNode, WhileStatementNode, FuncDefNode, CallNode, StatementsNode)
+from .Interpreter import Interpreter, Number, Bool, String
+from .Context import Context
+from .Lexer import KINDS
+
+ENABLED = True
+
+# how deep visit() recurses, subtrees nested deeper than that are left as they are
+MAX_RECURSION = 100
+
+# folds that would build a huge number or string are left for runtime, which may never get to them. A run with Governor.Limits folds
+# nothing bigger than its limits either, so going over them is reported at runtime
+MAX_FOLD_BITS = 4096
+MAX_FOLD_LENGTH = 4096
+
+LITERALS = (NumberNode, BoolNode, StringNode)
+
+# the fields of each node type that hold child nodes, directly or in a list (arg_nodes, statement_nodes) or list of pairs (cases)
+CHILDREN = {
+    BinOpNode: ('left', 'right'),
+    UnaryOpNode: ('node', ),
+    VarAssignNode: ('value_node', ),
+    IfStatementNode: ('cases', 'else_case'),
+    ForStatementNode: ('start_node', 'end_node', 'step_node', 'main_node'),
+    WhileStatementNode: ('check_node', 'main_node'),
+    FuncDefNode: ('main_node', ),
+    CallNode: ('call_node', 'arg_nodes'),
+    StatementsNode: ('statement_nodes', ),
+}
+
+# node type -> the slots copy_node() copies
+COPIED_SLOTS = {}
+
+def optimize(node, max_bits=None, max_length=None):
+    return Optimizer(max_bits, max_length).visit(node)
+
+def copy_node(node, fields):
+    # a copy with the same span and every other slot, not rebuilt through __init__, which would recompute the span from the children.
+    # pos_start/pos_end aren't copied, Node.__getattr__ builds them again from the span if they are ever needed
+    cls = type(node)
+    names = COPIED_SLOTS.get(cls)
+    if names is None:
+        names = COPIED_SLOTS[cls] = tuple(name for klass in cls.__mro__ for name in klass.__dict__.get('__slots__', ())
+                                          if name not in ('pos_start', 'pos_end'))
+
+    copy = object.__new__(cls)
+    for name in names:
+        setattr(copy, name, fields[name] if name in fields else getattr(node, name))
+    return copy
+
+class Optimizer:
+    # folding only uses binop()/unaryop(), which keep no state, so every Optimizer shares one Interpreter
+    interpreter = Interpreter()
+    context = Context('<optimizer>')
+
+    def __init__(self, max_bits=None, max_length=None):
+        self.depth = 0
+        # the biggest int and string a fold may make, MAX_FOLD_BITS and MAX_FOLD_LENGTH unless they are given
+        self.max_bits = MAX_FOLD_BITS if max_bits is None else max_bits
+        self.max_length = MAX_FOLD_LENGTH if max_length is None else max_length
+
+    def visit(self, node):
+        # node optimized after its children, node itself if nothing in it changed
+        fields = CHILDREN.get(type(node))
+        if fields is None or self.depth > MAX_RECURSION:
+            return node
+
+        self.depth += 1
+        changes = {}
+        for name in fields:
+            value = getattr(node, name)
+            new = self.swap(value)
+            if new is not value:
+                changes[name] = new
+        self.depth -= 1
+
+        if changes:
+            node = copy_node(node, changes)
+
+        node_type = type(node)
+        if node_type is BinOpNode or node_type is UnaryOpNode:
+            return self.fold(node)
+        if node_type is IfStatementNode:
+            return self.prune(node)
+        return node
+
+    def swap(self, value):
+        # a field's value with every node in it optimized, value itself if none of them changed
+        if type(value) is list or type(value) is tuple:
+            items = [self.swap(item) for item in value]
+            if all(new is old for new, old in zip(items, value)):
+                return value
+            return type(value)(items)
+
+        if value is None:
+            return None
+        return self.visit(value)
+
+    def value(self, node):
+        # the Value exec() would make for a literal node, without its position, which folding never reports
+        if type(node) is NumberNode:
+            return Number(node.value).set_Context(self.context)
+        if type(node) is BoolNode:
+            return Bool(node.value).set_Context(self.context)
+        return String(node.value).set_Context(self.context)
+
+    def literal(self, value, node):
+        if type(value) is Number:
+            return NumberNode(value.value, node.start, node.end, node.src)
+        if type(value) is Bool:
+            return BoolNode(value.value, node.start, node.end, node.src)
+        return StringNode(value.value, node.start, node.end, node.src)
+
+    def fold(self, node):
+        if type(node) is BinOpNode:
+            if type(node.left) not in LITERALS or type(node.right) not in LITERALS:
+                return node
+            left, right = self.value(node.left), self.value(node.right)
+            if self.too_big(node.op, left, right):
+                return node
+            apply = lambda: self.interpreter.binop(node, left, right, self.context)
+        else:
+            if type(node.node) not in LITERALS:
+                return node
+            operand = self.value(node.node)
+            apply = lambda: self.interpreter.unaryop(node, operand, self.context)
+
+        try:
+            value = apply()
+        except Exception:
+            # an RTError (raised as an RTException) or an error raised by Python, exec() has to report it when it gets there
+            return node
+
+        if type(value) not in (Number, Bool, String):
+            return node
+        if type(value.value) is int and value.value.bit_length() > self.max_bits or type(value.value) is str and len(value.value) > self.max_length:
+            return node
+        return self.literal(value, node)
+
+    def too_big(self, op, left, right):
+        if op == KINDS['^'] and type(left) is Number and type(right) is Number:
+            base, exponent = left.value, right.value
+            return isinstance(base, int) and isinstance(exponent, int) and abs(base).bit_length() * exponent > self.max_bits
+        if op == KINDS['*'] and type(left) is String and type(right) is Number:
+            return isinstance(right.value, int) and len(left.value) * right.value > self.max_length
+        return False
+
+    def prune(self, node):
+        cases = []
+        else_case = node.else_case
+
+        for condition, expr in node.cases:
+            if type(condition) not in LITERALS:
+                cases.append((condition, expr))
+            elif self.value(condition).true_():
+                else_case = expr
+                break
+
+        if not cases:
+            # handle_IfStatementNode returns the branch's own value, so the branch can stand in for the whole if
+            if else_case is not None:
+                return else_case
+            return node
+
+        if len(cases) == len(node.cases) and else_case is node.else_case:
+            return node
+        return copy_node(node, {'cases': cases, 'else_case': else_case})
@@ -1,161 +1,385 @@
-from .Lexer import TOKENS, KEYWORDS
+from .Lexer import TOKENS, KEYWORDS, KINDS, KIND_NAMES, KIND_SYMBOLS
+from .Position import Position
 from .ErrorHandler import SyntaxError_
 from .Result import ParseResult
 
-class NumberNode:
-    def __init__(self, token):
-        self.tok = token
-
-        self.pos_start = self.tok[2][0]
-        self.pos_end = self.tok[2][1]
+PREC_LOGIC = 1
+PREC_COMPARISON = 2
+PREC_ARITHMATIC = 3
+PREC_TERM = 4
+PREC_POWER = 5
+
+# how many binary()/expr() calls may be nested on the Python stack, anything deeper is parsed by parse_deep() instead
+MAX_RECURSION = 100
+
+BINARY_PREC = {
+    KINDS[KEYWORDS['AND']]: PREC_LOGIC,
+    KINDS[KEYWORDS['OR']]: PREC_LOGIC,
+    KINDS['<']: PREC_COMPARISON,
+    KINDS['>']: PREC_COMPARISON,
+    KINDS['==']: PREC_COMPARISON,
+    KINDS['!=']: PREC_COMPARISON,
+    KINDS['<=']: PREC_COMPARISON,
+    KINDS['>=']: PREC_COMPARISON,
+    KINDS['+']: PREC_ARITHMATIC,
+    KINDS['-']: PREC_ARITHMATIC,
+    KINDS['*']: PREC_TERM,
+    KINDS['/']: PREC_TERM,
+    KINDS['^']: PREC_POWER
+}
+
+# Every node keeps only its source span, start and end offsets into src.text, and the fields the Interpreter reads.
+# pos_start and pos_end are left unset by the parser, the first read (by the Interpreter, when it runs the node) falls through to
+# __getattr__, which builds the Position and stores it in the slot, so every read after that is a plain slot read.
+# __reduce__ pickles a node as its constructor arguments (see Cache), which is far smaller and faster to load than its slots.
+class Node:
+    __slots__ = ('start', 'end', 'src', 'pos_start', 'pos_end')
+
+    def __getattr__(self, name):
+        if name == 'pos_start':
+            self.pos_start = Position(self.start, self.src)
+            return self.pos_start
+        if name == 'pos_end':
+            self.pos_end = Position(self.end, self.src)
+            return self.pos_end
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def shift(self, delta):
+        # moves the span, and the Positions already built for it, by delta
+        self.start += delta
+        self.end += delta
+        for name in ('pos_start', 'pos_end'):
+            try:
+                object.__getattribute__(self, name).idx += delta
+            except AttributeError:
+                pass
+
+class NumberNode(Node):
+    __slots__ = ('value',)
+
+    def __init__(self, value, start, end, src):
+        self.value = value
+
+        self.start = start
+        self.end = end
+        self.src = src
 
     def __repr__(self):
-        return f'{self.tok[0]}:{self.tok[1]}'
+        return f'{TOKENS["float"] if isinstance(self.value, float) else TOKENS["int"]}:{self.value}'
+
+    def __reduce__(self):
+        return (NumberNode, (self.value, self.start, self.end, self.src))
 
-class BoolNode:
-    def __init__(self, token):
-        self.tok = token
+class BoolNode(Node):
+    __slots__ = ('value',)
 
-        self.pos_start = self.tok[2][0]
-        self.pos_end = self.tok[2][1]
+    def __init__(self, value, start, end, src):
+        self.value = value
+
+        self.start = start
+        self.end = end
+        self.src = src
 
     def __repr__(self):
-        return f'{self.tok[0]}:{self.tok[1]}'
+        return f'{TOKENS["bool"]}:{self.value}'
+
+    def __reduce__(self):
+        return (BoolNode, (self.value, self.start, self.end, self.src))
 
-class StringNode:
-    def __init__(self, token):
-        self.tok = token
+class StringNode(Node):
+    __slots__ = ('value',)
 
-        self.pos_start = self.tok[2][0]
-        self.pos_end = self.tok[2][1]
+    def __init__(self, value, start, end, src):
+        self.value = value
+
+        self.start = start
+        self.end = end
+        self.src = src
 
     def __repr__(self):
-        return f'{self.tok[0]}:{self.tok[1]}'
+        return f'{TOKENS["str"]}:{self.value}'
+
+    def __reduce__(self):
+        return (StringNode, (self.value, self.start, self.end, self.src))
+
+class BinOpNode(Node):
+    __slots__ = ('left', 'op', 'right', 'cache')
 
-class BinOpNode:
     def __init__(self, left, op, right):
         self.op = op
         self.left = left
         self.right = right
+        # filled in by the Interpreter the first time it runs the node, see Interpreter.InlineCache
+        self.cache = None
 
-        self.pos_start = self.left.pos_start
-        self.pos_end = self.right.pos_end
+        self.start = self.left.start
+        self.end = self.right.end
+        self.src = self.left.src
 
     def __repr__(self):
-        return f'({self.left}, {self.op[0]}:{self.op[1]}, {self.right})'
+        return f'({self.left}, {KIND_NAMES[self.op]}:{KIND_SYMBOLS[self.op]}, {self.right})'
+
+    def __reduce__(self):
+        return (BinOpNode, (self.left, self.op, self.right))
 
-class UnaryOpNode:
-    def __init__(self, op, node):
+class UnaryOpNode(Node):
+    __slots__ = ('op', 'node')
+
+    def __init__(self, op, start, node):
         self.op = op
         self.node = node
 
-        self.pos_start = self.op[2][0]
-        self.pos_end = self.node.pos_end
+        self.start = start
+        self.end = self.node.end
+        self.src = self.node.src
 
     def __repr__(self):
-        return f'({self.op[0]}:{self.op[1]}, {self.node})'
+        return f'({KIND_NAMES[self.op]}:{KIND_SYMBOLS[self.op]}, {self.node})'
+
+    def __reduce__(self):
+        return (UnaryOpNode, (self.op, self.start, self.node))
 
-class VarAssignNode:
-    def __init__(self, var_tok, value_node):
-        self.var_tok = var_tok
+class VarAssignNode(Node):
+    __slots__ = ('var_name', 'value_node', 'slot')
+
+    def __init__(self, var_name, start, value_node):
+        self.var_name = var_name
         self.value_node = value_node
+        # filled in by the Resolver, see there
+        self.slot = None
+
+        self.start = start
+        self.end = self.value_node.end
+        self.src = self.value_node.src
 
-        self.pos_start = self.var_tok[2][0]
-        self.pos_end = self.value_node.pos_end
+    def __reduce__(self):
+        return (VarAssignNode, (self.var_name, self.start, self.value_node))
 
+class VarAccessNode(Node):
+    __slots__ = ('var_name', 'depth', 'slot')
 
-class VarAccessNode:
-    def __init__(self, var_tok):
-        self.var_tok = var_tok
+    def __init__(self, var_name, start, end, src):
+        self.var_name = var_name
+        # filled in by the Resolver, see there
+        self.depth = None
+        self.slot = None
 
-        self.pos_start = self.var_tok[2][0]
-        self.pos_end = self.var_tok[2][1]
+        self.start = start
+        self.end = end
+        self.src = src
+
+    def __reduce__(self):
+        return (VarAccessNode, (self.var_name, self.start, self.end, self.src))
+
+class IfStatementNode(Node):
+    __slots__ = ('cases', 'else_case')
 
-class IfStatementNode:
     def __init__(self, cases, else_case):
         self.cases = cases
         self.else_case = else_case
 
-        self.pos_start = self.cases[0][0].pos_start
-        self.pos_end = (self.else_case or self.cases[len(self.cases) - 1][0]).pos_start
+        self.start = self.cases[0][0].start
+        self.end = (self.else_case or self.cases[len(self.cases) - 1][0]).start
+        self.src = self.cases[0][0].src
+
+    def __reduce__(self):
+        return (IfStatementNode, (self.cases, self.else_case))
 
-class ForStatementNode:
-    def __init__(self, var_tok, start_val_node, end_val_node, main_node, step_val_node):
-        self.var_tok = var_tok
+class ForStatementNode(Node):
+    __slots__ = ('var_name', 'start_node', 'end_node', 'step_node', 'main_node', 'slot')
+
+    def __init__(self, var_name, start, start_val_node, end_val_node, main_node, step_val_node):
+        self.var_name = var_name
+        # filled in by the Resolver, see there
+        self.slot = None
         self.start_node = start_val_node
         self.end_node = end_val_node
         self.step_node = step_val_node
         self.main_node = main_node
 
-        self.pos_start = self.var_tok[2][0]
-        self.pos_end = self.main_node.pos_end
+        self.start = start
+        self.end = self.main_node.end
+        self.src = self.main_node.src
+
+    def __reduce__(self):
+        return (ForStatementNode, (self.var_name, self.start, self.start_node, self.end_node, self.main_node, self.step_node))
+
+class WhileStatementNode(Node):
+    __slots__ = ('check_node', 'main_node')
 
-class WhileStatementNode:
     def __init__(self, check_node, main_node):
         self.check_node = check_node
         self.main_node = main_node
 
-        self.pos_start = self.check_node.pos_start
-        self.pos_end = self.main_node.pos_end
+        self.start = self.check_node.start
+        self.end = self.main_node.end
+        self.src = self.main_node.src
+
+    def __reduce__(self):
+        return (WhileStatementNode, (self.check_node, self.main_node))
 
-class FuncDefNode:
-    def __init__(self, var_tok, arg_toks, main_node):
-        self.var_tok = var_tok
-        self.arg_toks = arg_toks
+class FuncDefNode(Node):
+    __slots__ = ('var_name', 'arg_names', 'main_node', 'slot', 'scope', 'deps')
+
+    def __init__(self, var_name, arg_names, main_node, start=None):
+        # start is the offset of the name, or of the first argument for a lambda, else the body's
+        self.var_name = var_name
+        # filled in by the Resolver, see there
+        self.slot = None
+        self.scope = None
+        self.deps = None
+        self.arg_names = arg_names
         self.main_node = main_node
 
-        if self.var_tok:
-            self.pos_start = self.var_tok[2][0]
-        elif len(self.arg_toks):
-            self.pos_start = self.arg_toks[0][2][0]
-        else:
-            self.pos_start = self.main_node.pos_start
-        self.pos_end = self.main_node.pos_end
+        self.start = self.main_node.start if start is None else start
+        self.end = self.main_node.end
+        self.src = self.main_node.src
+
+    def __reduce__(self):
+        return (FuncDefNode, (self.var_name, self.arg_names, self.main_node, self.start))
+
+class CallNode(Node):
+    __slots__ = ('call_node', 'arg_nodes', 'tail')
 
-class CallNode:
     def __init__(self, call_node, arg_nodes):
         self.call_node = call_node
         self.arg_nodes = arg_nodes
+        # filled in by the Resolver, see there
+        self.tail = False
 
-        self.pos_start = self.call_node.pos_start
+        self.start = self.call_node.start
         if len(self.arg_nodes):
-            self.pos_end = self.arg_nodes[len(self.arg_nodes) - 1].pos_end
+            self.end = self.arg_nodes[len(self.arg_nodes) - 1].end
         else:
-            self.pos_end = self.call_node.pos_end
+            self.end = self.call_node.end
+        self.src = self.call_node.src
+
+    def __reduce__(self):
+        return (CallNode, (self.call_node, self.arg_nodes))
+
+class StatementsNode(Node):
+    __slots__ = ('statement_nodes',)
+
+    def __init__(self, statement_nodes):
+        self.statement_nodes = statement_nodes
+
+        self.start = self.statement_nodes[0].start
+        self.end = self.statement_nodes[len(self.statement_nodes) - 1].end
+        self.src = self.statement_nodes[0].src
+
+    def __reduce__(self):
+        return (StatementsNode, (self.statement_nodes, ))
+
 
 class Parser:
     def __init__(self, tokens):
+        # tokens is a Lexer TokenBuffer, the parser walks its kinds array and only builds a token tuple when a node keeps it
         self.tokens = tokens
-        self.idx = 0
-        self.current_tok = None
+        self.kinds = tokens.kinds
+        self.starts = tokens.starts
+        self.ends = tokens.ends
+        self.src = tokens.src
+        self.idx = -1
+        self.kind = None
         self.error = None
+        self.depth = 0
         self.advance()
 
     def advance(self):
-        if self.idx < len(self.tokens):
-            self.current_tok = self.tokens[self.idx]
+        # never moves past the EOF token at the end of the buffer
+        if self.idx < len(self.kinds) - 1:
             self.idx += 1
-        else:
-            self.current_tok = None
-        return self.current_tok
+        self.kind = self.kinds[self.idx]
+        return self.kind
+
+    def value(self):
+        return self.tokens.value(self.idx)
+
+    def tok_start(self):
+        return Position(self.starts[self.idx], self.src)
+
+    def tok_end(self):
+        return Position(self.ends[self.idx], self.src)
+
+    def line_end(self):
+        return Position(self.src.line_end(self.ends[self.idx]), self.src)
 
     def parse(self):
-        result = self.expr()
-        if not self.error and self.current_tok and self.current_tok[0] != TOKENS['eof']:
-            pos_start = self.current_tok[2][0].copy()
-            pos_end = self.current_tok[2][1].copy()
-            while pos_end.idx < len(pos_end.fc) and pos_end.fc[pos_end.idx] not in '\n':
-                pos_end.advance(pos_end.fc[pos_end.idx])
-            return result.fail(SyntaxError_(f"Expected float, int, identifier, 'set', '+', '-' or '('", pos_start=pos_start, pos_end=pos_end))
-        return result
+        # the whole program, a program of one statement is just that statement's node, several are kept in a StatementsNode
+        nodes = []
+        for result in self.statements():
+            if result.error: return result
+            nodes.append(result.node)
+
+        if len(nodes) == 1:
+            return result
+
+        program = ParseResult()
+        program.advance_count = self.idx
+        return program.ok(StatementsNode(nodes))
+
+    def statements(self):
+        # yields each top-level statement's ParseResult as soon as it is parsed, and stops after the first one with an error.
+        # A statement ends at a ';' or at a token on a later line that can't continue it, so a line starting with an operator or '('
+        # still continues the statement above it.
+        while True:
+            result = self.expr()
+
+            if not result.error and self.kind != KINDS['eof']:
+                if self.kind == KINDS[';']:
+                    while self.kind == KINDS[';']:
+                        self.advance()
+                    yield result
+                    if self.kind == KINDS['eof']: return
+                    continue
+
+                if self.on_new_line():
+                    yield result
+                    continue
+
+            if not self.error and self.kind != KINDS['eof']:
+                pos_start = self.tok_start()
+                pos_end = self.line_end()
+                result.fail(SyntaxError_(f"Expected float, int, identifier, 'set', '+', '-' or '('", pos_start=pos_start, pos_end=pos_end))
+            yield result
+            return
+
+    def validate(self):
+        # every SyntaxError_ in the program instead of just the first, for checking code without running it. After an error the
+        # parser skips ahead to the next ';' or line, which is where the next statement starts, and carries on from there.
+        errors = []
+
+        while True:
+            start = self.idx
+            for result in self.statements():
+                if result.error:
+                    errors.append(result.error)
+
+            if self.kind == KINDS['eof']:
+                return errors
+
+            # always move on at least one token, or a statement that fails right where it starts would fail there forever
+            if self.idx == start:
+                self.advance()
+            while self.kind != KINDS['eof'] and self.kind != KINDS[';'] and not self.on_new_line():
+                self.advance()
+            while self.kind == KINDS[';']:
+                self.advance()
+
+            if self.kind == KINDS['eof']:
+                return errors
+
+    def on_new_line(self):
+        # whether the current token is on a later line than the one before it
+        return self.src.text.find('\n', self.ends[self.idx - 1], self.starts[self.idx]) != -1
 
     def if_sttmnt(self):
         result = ParseResult()
         cases = []
         else_case = None
 
-        if not (self.current_tok[0] == TOKENS['key'] and self.current_tok[1] == KEYWORDS['IF']):
-            return result.fail(SyntaxError_("Expected 'if'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+        if not (self.kind == KINDS[KEYWORDS['IF']]):
+            return result.fail(SyntaxError_("Expected 'if'", pos_start=self.tok_start(), pos_end=self.tok_end()))
         
         result.register_advance()
         self.advance()
@@ -163,8 +387,8 @@ class Parser:
         check = result.register(self.expr())
         if result.error: return result
 
-        if not (self.current_tok[0] == TOKENS['key'] and self.current_tok[1] == KEYWORDS['THEN']):
-            return result.fail(SyntaxError_("Expected 'do'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+        if not (self.kind == KINDS[KEYWORDS['THEN']]):
+            return result.fail(SyntaxError_("Expected 'do'", pos_start=self.tok_start(), pos_end=self.tok_end()))
         
         result.register_advance()
         self.advance()
@@ -173,15 +397,15 @@ class Parser:
         if result.error: return result
         cases.append((check, expr))
 
-        while self.current_tok[0] == TOKENS['key'] and self.current_tok[1] == KEYWORDS['ELIF']:
+        while self.kind == KINDS[KEYWORDS['ELIF']]:
             result.register_advance()
             self.advance()
 
             check = result.register(self.expr())
             if result.error: return result
 
-            if not(self.current_tok[0] == TOKENS['key'] and self.current_tok[1] == KEYWORDS['THEN']):
-                return result.fail(SyntaxError_("Expected 'do'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+            if not (self.kind == KINDS[KEYWORDS['THEN']]):
+                return result.fail(SyntaxError_("Expected 'do'", pos_start=self.tok_start(), pos_end=self.tok_end()))
             
             result.register_advance()
             self.advance()
@@ -190,7 +414,7 @@ class Parser:
             if result.error: return result
             cases.append((check, expr))
 
-        if self.current_tok[0] == TOKENS['key'] and self.current_tok[1] == KEYWORDS['ELSE']:
+        if self.kind == KINDS[KEYWORDS['ELSE']]:
             result.register_advance()
             self.advance()
 
@@ -202,21 +426,22 @@ class Parser:
     def for_sttmnt(self):
         result = ParseResult()
         
-        if not (self.current_tok[0] == TOKENS['key'] and self.current_tok[1] == KEYWORDS['FOR']):
-            return result.fail(SyntaxError_("Expected 'for'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+        if not (self.kind == KINDS[KEYWORDS['FOR']]):
+            return result.fail(SyntaxError_("Expected 'for'", pos_start=self.tok_start(), pos_end=self.tok_end()))
         
         result.register_advance()
         self.advance()
 
-        if  self.current_tok[0] != TOKENS['var']:
-            return result.fail(SyntaxError_("Expected identifier", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+        if  self.kind != KINDS['var']:
+            return result.fail(SyntaxError_("Expected identifier", pos_start=self.tok_start(), pos_end=self.tok_end()))
         
-        var = self.current_tok
+        var_name = self.value()
+        start = self.starts[self.idx]
         result.register_advance()
         self.advance()
 
-        if not (self.current_tok[0] == TOKENS['key'] and self.current_tok[1] == KEYWORDS['FROM']):
-            return result.fail(SyntaxError_("Expected 'from'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+        if not (self.kind == KINDS[KEYWORDS['FROM']]):
+            return result.fail(SyntaxError_("Expected 'from'", pos_start=self.tok_start(), pos_end=self.tok_end()))
         
         result.register_advance()
         self.advance()
@@ -224,8 +449,8 @@ class Parser:
         start_val = result.register(self.expr())
         if result.error: return result
 
-        if not (self.current_tok[0] == TOKENS['key'] and self.current_tok[1] == KEYWORDS['TO']):
-            return result.fail(SyntaxError_("Expected 'to'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+        if not (self.kind == KINDS[KEYWORDS['TO']]):
+            return result.fail(SyntaxError_("Expected 'to'", pos_start=self.tok_start(), pos_end=self.tok_end()))
         
         result.register_advance()
         self.advance()
@@ -233,7 +458,7 @@ class Parser:
         end_val = result.register(self.expr())
         if result.error: return result
 
-        if self.current_tok[0] == TOKENS['key'] and self.current_tok[1] == KEYWORDS['STEP']:
+        if self.kind == KINDS[KEYWORDS['STEP']]:
             result.register_advance()
             self.advance()
 
@@ -242,8 +467,8 @@ class Parser:
         else:
             step_val = None
 
-        if not (self.current_tok[0] == TOKENS['key'] and self.current_tok[1] == KEYWORDS['THEN']):
-            return result.fail(SyntaxError_("Expected 'then'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+        if not (self.kind == KINDS[KEYWORDS['THEN']]):
+            return result.fail(SyntaxError_("Expected 'then'", pos_start=self.tok_start(), pos_end=self.tok_end()))
         
         result.register_advance()
         self.advance()
@@ -251,13 +476,13 @@ class Parser:
         main = result.register(self.expr())
         if result.error: return result
 
-        return result.ok(ForStatementNode(var, start_val, end_val, main, step_val))
+        return result.ok(ForStatementNode(var_name, start, start_val, end_val, main, step_val))
 
     def while_sttmnt(self):
         result = ParseResult()
         
-        if not (self.current_tok[0] == TOKENS['key'] and self.current_tok[1] == KEYWORDS['WHILE']):
-            return result.fail(SyntaxError_("Expected 'while'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+        if not (self.kind == KINDS[KEYWORDS['WHILE']]):
+            return result.fail(SyntaxError_("Expected 'while'", pos_start=self.tok_start(), pos_end=self.tok_end()))
         
         result.register_advance()
         self.advance()
@@ -265,8 +490,8 @@ class Parser:
         check = result.register(self.expr())
         if result.error: return result
 
-        if not (self.current_tok[0] == TOKENS['key'] and self.current_tok[1] == KEYWORDS['THEN']):
-            return result.fail(SyntaxError_("Expected 'then'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+        if not (self.kind == KINDS[KEYWORDS['THEN']]):
+            return result.fail(SyntaxError_("Expected 'then'", pos_start=self.tok_start(), pos_end=self.tok_end()))
         
         result.register_advance()
         self.advance()
@@ -279,89 +504,93 @@ class Parser:
     def def_func(self):
         result = ParseResult()
 
-        if not (self.current_tok[0] == TOKENS['key'] and self.current_tok[1] == KEYWORDS['FUNCTION']):
-            return result.fail(SyntaxError_("Expected 'if'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+        if not (self.kind == KINDS[KEYWORDS['FUNCTION']]):
+            return result.fail(SyntaxError_("Expected 'if'", pos_start=self.tok_start(), pos_end=self.tok_end()))
         
         result.register_advance()
         self.advance()
 
-        if self.current_tok[0] == TOKENS['var']:
-            var_tok = self.current_tok
+        if self.kind == KINDS['var']:
+            var_name = self.value()
+            start = self.starts[self.idx]
             result.register_advance()
             self.advance()
-            if self.current_tok[0] != TOKENS['(']:
-                return result.fail(SyntaxError_("Expected '('", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+            if self.kind != KINDS['(']:
+                return result.fail(SyntaxError_("Expected '('", pos_start=self.tok_start(), pos_end=self.tok_end()))
         else:
-            var_tok = None
-            if self.current_tok[0] != TOKENS['(']:
-                return result.fail(SyntaxError_("Expected identifier or '('", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+            var_name = None
+            start = None
+            if self.kind != KINDS['(']:
+                return result.fail(SyntaxError_("Expected identifier or '('", pos_start=self.tok_start(), pos_end=self.tok_end()))
 
         result.register_advance()
         self.advance()
-        arg_toks = []
+        arg_names = []
 
-        if self.current_tok[0] == TOKENS['var']:
-            arg_toks.append(self.current_tok)
+        if self.kind == KINDS['var']:
+            arg_names.append(self.value())
+            if start is None:
+                start = self.starts[self.idx]
             result.register_advance()
             self.advance()
 
-            while self.current_tok[0] == TOKENS[',']:
+            while self.kind == KINDS[',']:
                 result.register_advance()
                 self.advance()
 
-                if self.current_tok[0] != TOKENS['var']:
-                    return result.fail(SyntaxError_("Expected identifier", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+                if self.kind != KINDS['var']:
+                    return result.fail(SyntaxError_("Expected identifier", pos_start=self.tok_start(), pos_end=self.tok_end()))
                 
-                arg_toks.append(self.current_tok)
+                arg_names.append(self.value())
                 result.register_advance()
                 self.advance()
 
-            if self.current_tok[0] != TOKENS[')']:
-                return result.fail(SyntaxError_("Expected ',' or ')'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+            if self.kind != KINDS[')']:
+                return result.fail(SyntaxError_("Expected ',' or ')'", pos_start=self.tok_start(), pos_end=self.tok_end()))
         else:
-            if self.current_tok[0] != TOKENS[')']:
-                return result.fail(SyntaxError_("Expected identifier or ')'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+            if self.kind != KINDS[')']:
+                return result.fail(SyntaxError_("Expected identifier or ')'", pos_start=self.tok_start(), pos_end=self.tok_end()))
         
         result.register_advance()
         self.advance()
 
-        if self.current_tok[0] != TOKENS['->']:
-            return result.fail(SyntaxError_("Expected '->'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+        if self.kind != KINDS['->']:
+            return result.fail(SyntaxError_("Expected '->'", pos_start=self.tok_start(), pos_end=self.tok_end()))
         
         result.register_advance()
         self.advance()
         return_node = result.register(self.expr())
         if result.error: return result
 
-        return result.ok(FuncDefNode(var_tok, arg_toks, return_node))
+        return result.ok(FuncDefNode(var_name, arg_names, return_node, start))
 
     def call(self):
         result = ParseResult()
         base = result.register(self.base())
         if result.error: return result
 
-        if self.current_tok[0] == TOKENS['(']:
+        if self.kind == KINDS['(']:
             result.register_advance()
             self.advance()
             arg_nodes = []
 
-            if self.current_tok[0] == TOKENS[')']:
+            if self.kind == KINDS[')']:
                 result.register_advance()
                 self.advance()
             else:
                 arg_nodes.append(result.register(self.expr()))
                 if result.error:
-                    return result.fail(SyntaxError_("Expected ')', 'set', 'if', 'for', 'while', 'fn', int, float, identifier, '+', '-', '(' or 'not'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+                    return result.fail(SyntaxError_("Expected ')', 'set', 'if', 'for', 'while', 'fn', int, float, identifier, '+', '-', '(' or 'not'", pos_start=self.tok_start(), pos_end=self.tok_end()))
                 
-                while self.current_tok[0] == TOKENS[',']:
+                while self.kind == KINDS[',']:
                     result.register_advance()
                     self.advance()
 
                     arg_nodes.append(result.register(self.expr()))
                     if result.error: return result
 
-                if self.current_tok[0] != TOKENS[')']:
-                    return result.fail(SyntaxError_("Expected ',' or ')'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+                if self.kind != KINDS[')']:
+                    return result.fail(SyntaxError_("Expected ',' or ')'", pos_start=self.tok_start(), pos_end=self.tok_end()))
                 
                 result.register_advance()
                 self.advance()
@@ -370,170 +599,302 @@ class Parser:
 
     def base(self):
         result = ParseResult()
-        tok = self.current_tok
+        kind = self.kind
 
-        if tok[0] in (TOKENS['int'], TOKENS['float']):
+        if kind == KINDS['int'] or kind == KINDS['float']:
+            node = NumberNode(self.value(), self.starts[self.idx], self.ends[self.idx], self.src)
             result.register_advance()
             self.advance()
-            return result.ok(NumberNode(tok))
+            return result.ok(node)
         
-        if tok[0] == TOKENS['bool']:
+        if kind == KINDS['bool']:
+            node = BoolNode(self.value(), self.starts[self.idx], self.ends[self.idx], self.src)
             result.register_advance()
             self.advance()
-            return result.ok(BoolNode(tok))
+            return result.ok(node)
 
-        if tok[0] == TOKENS['str']:
+        if kind == KINDS['str']:
+            node = StringNode(self.value(), self.starts[self.idx], self.ends[self.idx], self.src)
             result.register_advance()
             self.advance()
-            return result.ok(StringNode(tok))
+            return result.ok(node)
 
-        if tok[0] == TOKENS['var']:
+        if kind == KINDS['var']:
+            node = VarAccessNode(self.value(), self.starts[self.idx], self.ends[self.idx], self.src)
             result.register_advance()
             self.advance()
-            return result.ok(VarAccessNode(tok))
+            return result.ok(node)
 
-        if tok[0] == TOKENS['(']:
+        if kind == KINDS['(']:
             result.register_advance()
             self.advance()
             node = result.register(self.expr())
             if result.error: return result
-            if self.current_tok is None or self.current_tok[0] != TOKENS[')']:
-                if self.current_tok and self.current_tok[0] == TOKENS['eof']:
-                    pos_start = self.current_tok[2][1].copy()
+            if self.kind != KINDS[')']:
+                if self.kind == KINDS['eof']:
+                    pos_start = self.tok_end()
                     pos_end = pos_start.copy()
                 else:
-                    pos_start = self.current_tok[2][0].copy()
-                    pos_end = self.current_tok[2][1].copy()
+                    pos_start = self.tok_start()
+                    pos_end = self.tok_end()
                 return result.fail(SyntaxError_("Expected ')'", pos_start=pos_start, pos_end=pos_end))
             result.register_advance()
             self.advance()
             return result.ok(node)
         
-        if tok[0] == TOKENS['key'] and tok[1] == KEYWORDS['IF']:
+        if kind == KINDS[KEYWORDS['IF']]:
             if_state = result.register(self.if_sttmnt())
             if result.error: return result
             return result.ok(if_state)
         
-        if tok[0] == TOKENS['key'] and tok[1] == KEYWORDS['FOR']:
+        if kind == KINDS[KEYWORDS['FOR']]:
             for_state = result.register(self.for_sttmnt())
             if result.error: return result
             return result.ok(for_state)
 
-        if tok[0] == TOKENS['key'] and tok[1] == KEYWORDS['WHILE']:
+        if kind == KINDS[KEYWORDS['WHILE']]:
             while_state = result.register(self.while_sttmnt())
             if result.error: return result
             return result.ok(while_state)
         
-        if tok[0] == TOKENS['key'] and tok[1] == KEYWORDS['FUNCTION']:
+        if kind == KINDS[KEYWORDS['FUNCTION']]:
             func = result.register(self.def_func())
             if result.error: return result
             return result.ok(func)
 
-        pos_start = tok[2][0].copy()
-        pos_end = tok[2][1].copy()
-        while pos_end.idx < len(pos_end.fc) and pos_end.fc[pos_end.idx] not in '\n':
-            pos_end.advance(pos_end.fc[pos_end.idx])
+        pos_start = self.tok_start()
+        pos_end = self.line_end()
         return result.fail(SyntaxError_(f"Expected int, float, identifier, '+', '-', '('", pos_start=pos_start, pos_end=pos_end))
 
 
-    def power(self):
-        return self.Op(self.call, (TOKENS['^'], ), self.factor)
-
-    def factor(self):
-        result = ParseResult()
-        tok = self.current_tok
-
-        if tok[0] == TOKENS['-'] or tok[0] == TOKENS['+']:
-            result.register_advance()
-            self.advance()
-            factor_node = result.register(self.factor())
-            if result.error: return result
-            return result.ok(UnaryOpNode(tok, factor_node))
+    def binary(self, min_prec):
+        # precedence climbing: parses one operand, then every operator in BINARY_PREC that binds at least as tight as min_prec
+        # min_prec PREC_COMPARISON is what comparison() used to be, PREC_POWER is what factor() used to be
+        if self.depth > MAX_RECURSION:
+            return self.parse_deep(min_prec)
 
-        return self.power()
+        self.depth += 1
+        try:
+            result = ParseResult()
+            kind = self.kind
 
-    def term(self):
-        return self.Op(self.factor, (TOKENS['*'], TOKENS['/']))
+            if kind == KINDS[KEYWORDS['NOT']] and min_prec <= PREC_COMPARISON:
+                op = kind
+                start = self.starts[self.idx]
+                result.register_advance()
+                self.advance()
 
-    def arithmatic(self):
-        return self.Op(self.term, (TOKENS['+'], TOKENS['-']))
-    
-    def comparison(self):
-        result = ParseResult()
+                node = result.register(self.binary(PREC_COMPARISON))
+                if result.error: return result
+                left = UnaryOpNode(op, start, node)
+            elif kind == KINDS['-'] or kind == KINDS['+']:
+                op = kind
+                start = self.starts[self.idx]
+                result.register_advance()
+                self.advance()
 
-        if self.current_tok[0] == TOKENS['key'] and self.current_tok[1] == KEYWORDS['NOT']:
-            op = self.current_tok
-            result.register_advance()
-            self.advance()
+                node = result.register(self.binary(PREC_POWER))
+                if result.error: return result
+                left = UnaryOpNode(op, start, node)
+            else:
+                left = result.register(self.call())
+                if result.error:
+                    if min_prec == PREC_COMPARISON:
+                        return result.fail(SyntaxError_("Expected int, float, identifier, '+', '-', '(' or 'not'", pos_start=self.tok_start(), pos_end=self.tok_end()))
+                    return result
 
-            node = result.register(self.comparison())
-            if result.error: return result
-            return result.ok(UnaryOpNode(op, node))
+            prec = BINARY_PREC.get(self.kind)
+            while prec is not None and prec >= min_prec:
+                op = self.kind
+                result.register_advance()
+                self.advance()
 
-        node = result.register(self.Op(self.arithmatic, (TOKENS['<'], TOKENS['>'], TOKENS['=='], TOKENS['!='], TOKENS['<='], TOKENS['>='])))
+                # '^' is right associative, everything else is left associative
+                right = result.register(self.binary(prec if prec == PREC_POWER else prec + 1))
+                if result.error: return result
+                left = BinOpNode(left, op, right)
+                prec = BINARY_PREC.get(self.kind)
 
-        if result.error:
-            return result.fail(SyntaxError_("Expected int, float, identifier, '+', '-', '(' or 'not'", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
-        
-        return result.ok(node)
+            return result.ok(left)
+        finally:
+            self.depth -= 1
 
     def expr(self):
-        result = ParseResult()
+        if self.depth > MAX_RECURSION:
+            return self.parse_deep()
 
-        if self.current_tok[0] == TOKENS['key'] and self.current_tok[1] == KEYWORDS['VAR']:
-            result.register_advance()
-            self.advance()
+        self.depth += 1
+        try:
+            result = ParseResult()
 
-            if self.current_tok[0] != TOKENS['var']:
-                return result.fail(SyntaxError_(f"Expected Identifier", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+            if self.kind == KINDS[KEYWORDS['VAR']]:
+                result.register_advance()
+                self.advance()
 
-            var = self.current_tok
-            result.register_advance()
-            self.advance()
+                if self.kind != KINDS['var']:
+                    return result.fail(SyntaxError_(f"Expected Identifier", pos_start=self.tok_start(), pos_end=self.tok_end()))
 
-            if self.current_tok[0] != TOKENS['=']:
-                return result.fail(SyntaxError_(f"Expected '='", pos_start=self.current_tok[2][0], pos_end=self.current_tok[2][1]))
+                var_name = self.value()
+                start = self.starts[self.idx]
+                result.register_advance()
+                self.advance()
+
+                if self.kind != KINDS['=']:
+                    return result.fail(SyntaxError_(f"Expected '='", pos_start=self.tok_start(), pos_end=self.tok_end()))
             
-            result.register_advance()
-            self.advance()
+                result.register_advance()
+                self.advance()
             
-            expr = result.register(self.expr())
-            if result.error: return result
-            return result.ok(VarAssignNode(var, expr))
+                expr = result.register(self.expr())
+                if result.error: return result
+                return result.ok(VarAssignNode(var_name, start, expr))
         
-        node = result.register(self.Op(self.comparison, ((TOKENS['key'], KEYWORDS['AND']), (TOKENS['key'], KEYWORDS['OR']))))
+            node = result.register(self.binary(PREC_LOGIC))
 
-        if result.error:
-            return result.fail(SyntaxError_("Expected 'set', int, float, '+', '-', '(' or identifier", pos_start=self.current_tok[2][1], pos_end=self.current_tok[2][1]))
-        return result.ok(node)
-
-    def Op(self, func_a, ops, func_b=None):
-        if func_b == None:
-            func_b = func_a
+            if result.error:
+                return result.fail(SyntaxError_("Expected 'set', int, float, '+', '-', '(' or identifier", pos_start=self.tok_end(), pos_end=self.tok_end()))
+            return result.ok(node)
+        finally:
+            self.depth -= 1
 
+    def parse_deep(self, min_prec=None):
+        # expr() (min_prec None) or binary(min_prec) for code nested deeper than MAX_RECURSION, with the same nodes, errors and
+        # advance_count, but operators, prefix operators, parentheses, call arguments and 'set' are kept on an explicit stack of
+        # frames instead of the Python stack. if/for/while/fn still go through base(), whose expr() calls come back here.
         result = ParseResult()
-        left = result.register(func_a())
-        if result.error: return result
-        
-        while self.current_tok is not None:
-            match_ = False
-            for op_check in ops:
-                if isinstance(op_check, tuple):
-                    if self.current_tok[0] == op_check[0] and self.current_tok[1] == op_check[1]:
-                        match_ = True
+        start = self.idx
+        stack = []
+        want = 'expr' if min_prec is None else 'binary'
+        node = error = None
+
+        while True:
+            # open frames until a complete operand is reached
+            if want == 'expr':
+                if self.kind == KINDS[KEYWORDS['VAR']]:
+                    self.advance()
+
+                    if self.kind != KINDS['var']:
+                        error = SyntaxError_(f"Expected Identifier", pos_start=self.tok_start(), pos_end=self.tok_end())
                         break
-                else:
-                    if self.current_tok[0] == op_check:
-                        match_ = True
+
+                    var_name = self.value()
+                    var_start = self.starts[self.idx]
+                    self.advance()
+
+                    if self.kind != KINDS['=']:
+                        error = SyntaxError_(f"Expected '='", pos_start=self.tok_start(), pos_end=self.tok_end())
                         break
-            
-            if not match_:break
 
-            op = self.current_tok
-            result.register_advance()
-            self.advance()
-            right = result.register(func_b())
-            if result.error: return result
-            left = BinOpNode(left, op, right)
-        
-        return result.ok(left)
\ No newline at end of file
+                    self.advance()
+                    stack.append(('set', var_name, var_start))
+                    continue
+
+                stack.append(('expr', self.idx))
+                want = 'binary'
+                min_prec = PREC_LOGIC
+                continue
+
+            kind = self.kind
+            if kind == KINDS[KEYWORDS['NOT']] and min_prec <= PREC_COMPARISON:
+                stack.append(('unary', kind, self.starts[self.idx], min_prec))
+                self.advance()
+                min_prec = PREC_COMPARISON
+                continue
+
+            if kind == KINDS['-'] or kind == KINDS['+']:
+                stack.append(('unary', kind, self.starts[self.idx], min_prec))
+                self.advance()
+                min_prec = PREC_POWER
+                continue
+
+            stack.append(('left', self.idx, min_prec))
+            stack.append(('call', ))
+            if kind == KINDS['(']:
+                self.advance()
+                stack.append(('paren', ))
+                want = 'expr'
+                continue
+
+            base = self.base()
+            if base.error:
+                error = base.error
+                break
+            node = base.node
+
+            # hand node to the frames waiting for it, until one of them needs another operand
+            want = None
+            while stack:
+                frame = stack.pop()
+                label = frame[0]
+
+                if label == 'paren':
+                    if self.kind != KINDS[')']:
+                        if self.kind == KINDS['eof']:
+                            pos_start = self.tok_end()
+                            pos_end = pos_start.copy()
+                        else:
+                            pos_start = self.tok_start()
+                            pos_end = self.tok_end()
+                        error = SyntaxError_("Expected ')'", pos_start=pos_start, pos_end=pos_end)
+                        break
+                    self.advance()
+
+                elif label == 'call':
+                    if self.kind == KINDS['(']:
+                        self.advance()
+                        if self.kind == KINDS[')']:
+                            self.advance()
+                            node = CallNode(node, [])
+                        else:
+                            stack.append(('arg', node, []))
+                            want = 'expr'
+                            break
+
+                elif label == 'arg':
+                    frame[2].append(node)
+                    if self.kind == KINDS[',']:
+                        self.advance()
+                        stack.append(frame)
+                        want = 'expr'
+                        break
+                    if self.kind != KINDS[')']:
+                        error = SyntaxError_("Expected ',' or ')'", pos_start=self.tok_start(), pos_end=self.tok_end())
+                        break
+                    self.advance()
+                    node = CallNode(frame[1], frame[2])
+
+                elif label == 'set':
+                    node = VarAssignNode(frame[1], frame[2], node)
+
+                elif label != 'expr':
+                    if label == 'left':
+                        frame_prec = frame[2]
+                    elif label == 'unary':
+                        node = UnaryOpNode(frame[1], frame[2], node)
+                        frame_prec = frame[3]
+                    else:
+                        node = BinOpNode(frame[1], frame[2], node)
+                        frame_prec = frame[3]
+
+                    prec = BINARY_PREC.get(self.kind)
+                    if prec is not None and prec >= frame_prec:
+                        stack.append(('right', node, self.kind, frame_prec))
+                        self.advance()
+                        want = 'binary'
+                        min_prec = prec if prec == PREC_POWER else prec + 1
+                        break
+
+            if error or want is None:
+                break
+
+        result.advance_count = self.idx - start
+        if not error:
+            return result.ok(node)
+
+        # what binary() and expr() do with an error that comes back before they consumed anything
+        for frame in reversed(stack):
+            if frame[0] == 'left' and frame[2] == PREC_COMPARISON and frame[1] == self.idx:
+                error = SyntaxError_("Expected int, float, identifier, '+', '-', '(' or 'not'", pos_start=self.tok_start(), pos_end=self.tok_end())
+            elif frame[0] == 'expr' and frame[1] == self.idx:
+                error = SyntaxError_("Expected 'set', int, float, '+', '-', '(' or identifier", pos_start=self.tok_end(), pos_end=self.tok_end())
+        return result.fail(error)
@@ -1,30 +1,64 @@
 # Position.py
 # =====================================================================================================================================
-# Position Handler for Language, it keeps track of the current index(idx), line(ln), column(col), filename(fn) and filecontent(fc).
-# It has an advance method the advances to the next char, and if char is a newline indicator(\n), then it increments the line counter.
-# It also has a peek method which looks and retrieves the next char after the current char.
-# It has also a copy method, which just copies the Position into a copy of itself.
+# Position Handler for Language, a position is just an index(idx) into a Source, which holds the filename(fn) and filecontent(fc).
+# The line(ln) and column(col) are only worked out when something asks for them (in practice only when an Error is printed), from a
+# table of line start offsets that the Source builds once, the first time it is needed.
+# It also has a copy method, which just copies the Position into a copy of itself.
 # =====================================================================================================================================
 
+from bisect import bisect_right
+
+class Source:
+    __slots__ = ('fn', 'text', 'line_starts')
+
+    def __init__(self, fn, text):
+        self.fn = fn
+        self.text = text
+        self.line_starts = None
+
+    def set_text(self, text):
+        self.text = text
+        self.line_starts = None
+
+    def line_col(self, idx):
+        if self.line_starts is None:
+            text = self.text
+            starts = [0]
+            nl = text.find('\n')
+            while nl != -1:
+                starts.append(nl + 1)
+                nl = text.find('\n', nl + 1)
+            self.line_starts = starts
+
+        ln = bisect_right(self.line_starts, idx) - 1
+        return ln, idx - self.line_starts[ln]
+
+    def line_end(self, idx):
+        end = self.text.find('\n', idx)
+        return len(self.text) if end == -1 else end
+
 class Position:
-    def __init__(self, idx, ln, col, fn, fc):
+    __slots__ = ('idx', 'src')
+
+    def __init__(self, idx, src):
         self.idx = idx
-        self.ln = ln
-        self.col = col
-        self.fn = fn
-        self.fc = fc
+        self.src = src
+
+    @property
+    def ln(self):
+        return self.src.line_col(self.idx)[0]
 
-    def advance(self, char=None):
-        self.idx += 1
-        self.col += 1
+    @property
+    def col(self):
+        return self.src.line_col(self.idx)[1]
 
-        if char == '\n':
-            self.ln += 1
-            self.col = 0
-        return self
+    @property
+    def fn(self):
+        return self.src.fn
 
-    def peek(self):
-        return self.fc[self.idx + 1] if self.idx + 1 < len(self.fc) else None
+    @property
+    def fc(self):
+        return self.src.text
 
     def copy(self):
-        return Position(self.idx, self.ln, self.col, self.fn, self.fc)
\ No newline at end of file
+        return Position(self.idx, self.src)
@@ -0,0 +1,166 @@
+# Resolver.py
+# =====================================================================================================================================
+# Pass between the Optimizer and the Interpreter that works out, once per run, where every variable a function body uses lives, so a
+# call's variables are a list indexed by slot rather than a dict looked up by name, parent after parent.
+#  - each FuncDefNode gets a Scope: its args and every name its body binds with 'set', 'for' or 'fn', one slot each. Calling the
+#    function gives it a SymbolTable with that many slots (see SymbolTable)
+#  - inside a function body, each VarAccessNode gets a (depth, slot) pair: how many frames up the function that binds the name is, and
+#    its slot there. A name no function around it binds gets the depth of the global frame and slot None: globals, nil and anything
+#    another run defines stay in the global dict. 'set', 'for' and 'fn' get the slot they bind
+#  - each FuncDefNode whose body only computes with its args and calls functions by name gets deps, the names it calls: it is pure when
+#    they are too, and the Interpreter memoizes its calls (see Interpreter.Memo)
+#  - each CallNode in tail position, the body of a function or a branch of an if that is, is marked tail: its value is the value of the
+#    call it is in, so the Interpreter leaves the call for Function.execute to make after the body returns (see TailCall)
+# Code outside any function is left as it is, it runs in the global frame and looks its names up there. A frame only trusts the pairs
+# while every frame above it is the frame of the function around it, see SymbolTable.lexical; otherwise, and for a slot that is still
+# empty, names are looked up one frame at a time like before, so every read finds the same value.
+# Nodes are never modified, like in the Optimizer, and subtrees nested deeper than MAX_RECURSION are left unresolved, which only makes
+# them look their names up by name.
+# =====================================================================================================================================
+
+from .Parser import VarAccessNode, VarAssignNode, IfStatementNode, ForStatementNode, WhileStatementNode, FuncDefNode, CallNode
+from .Optimizer import CHILDREN, copy_node
+from .SymbolTable import Scope
+
+# how deep visit() recurses, subtrees nested deeper than that are left as they are
+MAX_RECURSION = 100
+
+def resolve(node):
+    return Resolver().visit(node)
+
+def bound_names(node):
+    # args first, then every name the body of the FuncDefNode binds in the function's own frame, in order. A function defined in the
+    # body binds its name there, its args and body are its own. Walked with an explicit stack, however deep the body, since a bound
+    # name missing from the scope would have reads of it resolved to the wrong frame
+    names = dict.fromkeys(node.arg_names)
+    stack = [node.main_node]
+
+    while stack:
+        node = stack.pop()
+        node_type = type(node)
+
+        if node_type is VarAssignNode or node_type is ForStatementNode:
+            names[node.var_name] = None
+        elif node_type is FuncDefNode:
+            if node.var_name:
+                names[node.var_name] = None
+            continue
+
+        for name in reversed(CHILDREN.get(node_type, ())):
+            value = getattr(node, name)
+            if type(value) is list:
+                for item in reversed(value):
+                    stack.extend(reversed(item) if type(item) is tuple else (item, ))
+            elif value is not None:
+                stack.append(value)
+
+    return names
+
+def pure_deps(node):
+    # the names of the functions the body of the FuncDefNode calls, when all the body does is compute with its args and call functions
+    # by name, None when it reads any other name, binds one, loops or defines a function. Calls of an arg are left out, a call passing
+    # a function is never memoized
+    args = node.arg_names
+    deps = {}
+    stack = [node.main_node]
+
+    while stack:
+        node = stack.pop()
+        node_type = type(node)
+
+        if node_type is VarAccessNode:
+            if node.var_name not in args:
+                return None
+            continue
+        if node_type is CallNode and type(node.call_node) is VarAccessNode:
+            if node.call_node.var_name not in args:
+                deps[node.call_node.var_name] = None
+            stack.extend(node.arg_nodes)
+            continue
+        if node_type is VarAssignNode or node_type is ForStatementNode or node_type is WhileStatementNode or node_type is FuncDefNode:
+            return None
+
+        for name in CHILDREN.get(node_type, ()):
+            value = getattr(node, name)
+            if type(value) is list:
+                for item in value:
+                    stack.extend(item if type(item) is tuple else (item, ))
+            elif value is not None:
+                stack.append(value)
+
+    return tuple(deps)
+
+class Resolver:
+    def __init__(self):
+        self.depth = 0
+        # the Scope of every function around the node being visited, innermost last
+        self.scopes = []
+
+    def visit(self, node):
+        # node with every name in it resolved, node itself if nothing in it changed
+        node_type = type(node)
+        if node_type is VarAccessNode:
+            return copy_node(node, self.find(node.var_name)) if self.scopes else node
+
+        fields = CHILDREN.get(node_type)
+        if fields is None or self.depth > MAX_RECURSION:
+            return node
+
+        changes = {}
+        if node_type is FuncDefNode:
+            scope = Scope(bound_names(node), node.arg_names, self.scopes[-1] if self.scopes else None)
+            changes['scope'] = scope
+            changes['deps'] = pure_deps(node)
+        if self.scopes and (node_type is VarAssignNode or node_type is ForStatementNode or node_type is FuncDefNode and node.var_name):
+            changes['slot'] = self.scopes[-1].slots[node.var_name]
+
+        self.depth += 1
+        if node_type is FuncDefNode:
+            self.scopes.append(scope)
+        for name in fields:
+            value = getattr(node, name)
+            new = self.swap(value)
+            if new is not value:
+                changes[name] = new
+        if node_type is FuncDefNode:
+            self.scopes.pop()
+            changes['main_node'] = self.tail(changes.get('main_node', node.main_node), self.depth)
+        self.depth -= 1
+
+        return copy_node(node, changes) if changes else node
+
+    def swap(self, value):
+        # a field's value with every node in it resolved, value itself if none of them changed
+        if type(value) is list or type(value) is tuple:
+            items = [self.swap(item) for item in value]
+            if all(new is old for new, old in zip(items, value)):
+                return value
+            return type(value)(items)
+
+        if value is None:
+            return None
+        return self.visit(value)
+
+    def tail(self, node, depth):
+        # node with the calls in tail position in it marked, node itself if it has none
+        if depth > MAX_RECURSION:
+            return node
+
+        if type(node) is CallNode:
+            return copy_node(node, {'tail': True})
+
+        if type(node) is IfStatementNode:
+            cases = [(check, self.tail(expr, depth + 1)) for check, expr in node.cases]
+            else_case = self.tail(node.else_case, depth + 1) if node.else_case is not None else None
+            if all(new is old for (_, new), (_, old) in zip(cases, node.cases)) and else_case is node.else_case:
+                return node
+            return copy_node(node, {'cases': cases, 'else_case': else_case})
+
+        return node
+
+    def find(self, name):
+        # the depth and slot of name, for a VarAccessNode inside a function
+        for depth, scope in enumerate(reversed(self.scopes)):
+            if name in scope.slots:
+                return {'depth': depth, 'slot': scope.slots[name]}
+        return {'depth': len(self.scopes), 'slot': None}
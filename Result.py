@@ -1,4 +1,6 @@
 class ParseResult:
+    __slots__ = ('error', 'node', 'advance_count')
+
     def __init__(self):
         self.error = None
         self.node = None
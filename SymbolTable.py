@@ -1,16 +1,81 @@
+class Scope:
+    # the layout of the frame a call of a function gets, worked out by the Resolver: the slot of every name the function binds, and the
+    # scope of the function it is defined in, None for one defined at the top level
+    def __init__(self, names, args=(), parent=None):
+        self.slots = {name: slot for slot, name in enumerate(names)}
+        # the slot of each arg, in order
+        self.arg_slots = tuple(self.slots[name] for name in args)
+        self.parent = parent
+        # frames of finished calls, for the next calls to reuse, see Interpreter.call()
+        self.frames = []
+
 class SymbolTable:
-    def __init__(self, parent=None):
+    __slots__ = ('variables', 'parent', 'scope', 'slots', 'lexical', 'captured')
+
+    def __init__(self, parent=None, scope=None):
         self.variables = {}
+        self.scope = scope
+        # the frame of a resolved function keeps its names in a list, one slot each
+        self.slots = [None] * len(scope.slots) if scope else None
+        # whether a Function defined in (or passed to) the call holds on to the frame, which then can't be reused
+        self.captured = False
+        self.reset(parent)
+
+    def reset(self, parent):
         self.parent = parent
+        scope = self.scope
+        # (depth, slot) pairs from the Resolver only hold on a chain of frames laid out like the scopes around the function, which a
+        # function called from somewhere it wasn't defined (passed as an argument) doesn't get
+        if not scope:
+            self.lexical = False
+        elif scope.parent:
+            self.lexical = parent is not None and parent.scope is scope.parent and parent.lexical
+        else:
+            self.lexical = parent is not None and parent.scope is None and parent.parent is None
+
+    def clear(self):
+        # empties the frame for reuse
+        if self.slots:
+            self.slots[:] = [None] * len(self.slots)
+        self.variables.clear()
+        self.parent = None
 
     def get(self, name):
-        value = self.variables.get(name, None)
-        if value == None and self.parent:
-            value = self.parent.get(name)
+        table = self
+        while table:
+            scope = table.scope
+            if scope and name in scope.slots:
+                value = table.slots[scope.slots[name]]
+            else:
+                value = table.variables.get(name)
+            # a stored None, what a for or while evaluates to, counts as not set
+            if value is not None:
+                return value
+            table = table.parent
+        return None
+
+    def lookup(self, depth, slot, name):
+        # get(name) for a name the Resolver found depth frames up, in slot of that frame, or for slot None in its variables
+        table = self
+        while depth:
+            table = table.parent
+            depth -= 1
+
+        value = table.variables.get(name) if slot is None else table.slots[slot]
+        if value is None and table.parent:
+            return table.parent.get(name)
         return value
-    
+
     def set(self, name, value):
-        self.variables[name] = value
+        scope = self.scope
+        if scope and name in scope.slots:
+            self.slots[scope.slots[name]] = value
+        else:
+            self.variables[name] = value
 
     def remove(self, name):
-        del self.variables[name]
\ No newline at end of file
+        scope = self.scope
+        if scope and name in scope.slots:
+            self.slots[scope.slots[name]] = None
+        else:
+            del self.variables[name]
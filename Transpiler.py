@@ -0,0 +1,461 @@
+# Transpiler.py
+# =====================================================================================================================================
+# Python backend. transpile() turns an AST into the source of a Python module, parses that into an ast.Module and compile()s it, so
+# the program runs as CPython bytecode instead of through Interpreter.exec(): every function body becomes a Python function, a for
+# loop a Python for over a range, and an operator on two ints the Python operator itself, guarded by a type check. Anything the
+# guards don't cover, another type, a division by zero, goes to the Interpreter's binop()/unaryop(), which checks it and reports it
+# like it always does.
+# The code works on what exec() returns, a plain value or a Value (see Interpreter), and reads and writes the same frames, in the
+# slots the Resolver gave each name, so both backends give the same values and the same errors. Subtrees nested deeper than
+# MAX_RECURSION, which Python's parser can't take, run on the Interpreter.
+# Every line of the module maps back to the node it was made for: an error raised by Python itself, not an RTError, leaves Program
+# with a note of the RAPL file and line it was raised at.
+# Selected with MainHandler.BACKEND = 'python'. Program.source is the generated code, for debugging.
+# =====================================================================================================================================
+
+import ast
+import builtins
+import re
+
+from .ErrorHandler import RTException
+from .Context import Context
+from .SymbolTable import SymbolTable
+from .Interpreter import Interpreter, Number, String, Function, TailCall, PLAIN_TYPES, box, truthy, plain, new_memo, memo_key
+from .Lexer import KINDS, KEYWORDS
+
+# how deep transpile() nests the code of a node in the code of the one around it, deeper subtrees are left to the Interpreter
+MAX_RECURSION = 25
+
+# what the generated code keeps an expression in when a later one has lines of its own, see Transpiler.operands()
+TEMPORARY = re.compile(r'_t\d+')
+
+# operator kind -> the Python expression for it on two ints, the same value NUMBER_OPERATIONS gives
+INT_OPERATIONS = {
+    KINDS['+']: '{} + {}',
+    KINDS['-']: '{} - {}',
+    KINDS['*']: '{} * {}',
+    KINDS['/']: '{} / {}',
+    KINDS['^']: '{} ** {}',
+    KINDS['==']: '1 if {} == {} else 0',
+    KINDS['!=']: '1 if {} != {} else 0',
+    KINDS['<']: '1 if {} < {} else 0',
+    KINDS['>']: '1 if {} > {} else 0',
+    KINDS['<=']: '1 if {} <= {} else 0',
+    KINDS['>=']: '1 if {} >= {} else 0',
+    KINDS[KEYWORDS['AND']]: '{} and {}',
+    KINDS[KEYWORDS['OR']]: '{} or {}',
+}
+
+def transpile(node, fn='<program>'):
+    return Transpiler().transpile(node, fn)
+
+class PyFunction(Function):
+    def __init__(self, fn_name, main_node, args, scope, body):
+        super().__init__(fn_name, main_node, args, scope)
+        self.body = body
+
+    def run(self, context):
+        try:
+            value = self.body(context)
+            if type(value) is TailCall:
+                return call(value.function, value.args, value.node), None
+        except RTException as exception:
+            return None, exception.error
+        return box(value, context, self.main_node), None
+
+    def copy(self):
+        copy = PyFunction(self.name, self.main_node, self.args, self.scope, self.body)
+        copy.memo = self.memo
+        copy.set_Context(self.context)
+        copy.set_Pos(self.start_pos, self.end_pos)
+        return copy
+
+class Program:
+    def __init__(self, source, code, namespace, lines, node):
+        self.source = source
+        self.code = code
+        self.namespace = namespace
+        # the node every line of source was made for, by line number
+        self.lines = lines
+        self.node = node
+
+    def __call__(self, context):
+        # runs the program in context, returns (value, error) like Interpreter.evaluate()
+        namespace = dict(self.namespace, _lines=self.lines)
+        builtins.exec(self.code, namespace)
+        try:
+            value = namespace['_main'](context)
+        except RTException as exception:
+            return None, exception.error
+        except Exception as exception:
+            self.annotate(exception)
+            raise
+        return box(value, context, self.node), None
+
+    def annotate(self, exception):
+        # notes the RAPL file and line of the last line of generated code exception went through, in this program or in a function
+        # another one defined, each of which finds the lines of its own program in its globals
+        node = None
+        traceback = exception.__traceback__
+        while traceback:
+            lines = traceback.tb_frame.f_globals.get('_lines')
+            if lines is not None and traceback.tb_frame.f_code.co_filename.startswith('<rapl '):
+                node = lines[traceback.tb_lineno]
+            traceback = traceback.tb_next
+
+        if node is not None:
+            exception.add_note(f"   File {node.pos_start.fn}, line {node.pos_start.ln + 1}, in RAPL code")
+
+# what the generated code calls, for what it doesn't do itself
+def call_node(node, function, args, context):
+    # handle_CallNode(), with the function and args already evaluated
+    if type(function) is PyFunction:
+        if node.tail:
+            return TailCall(function, args, node)
+        return call(function, args, node)
+
+    function = box(function, context, node.call_node).copy().set_Pos(node.pos_start, node.pos_end)
+    args = [box(arg, context, arg_node) for arg, arg_node in zip(args, node.arg_nodes)]
+
+    value, error = function.execute(args)
+    if error: raise RTException(error)
+    return value
+
+def call(function, args, node):
+    # Interpreter.call() for a PyFunction, which runs its body instead of exec()ing its main node, with the same Memo lookups
+    pending = None
+    while True:
+        if len(args) != len(function.args):
+            # raises the same error a Function called with the wrong number of args does
+            return interpreter.call(function, args, node)
+
+        entry = None
+        memo = function.memo
+        if memo is not None and memo.active:
+            key = memo_key(args)
+            if key is not None and memo.valid(function):
+                value = memo.lookup(key, function, node.pos_start)
+                if value is not None:
+                    for pending_call in pending or ():
+                        pending_call[0].store(pending_call[1], value, False)
+                    return value
+
+                entry = (memo, key)
+                pending = pending or []
+                pending.append(entry)
+
+        new_context = Context(function.name, function.context, node.pos_start)
+        scope = function.scope
+        if scope and scope.frames:
+            symbol_table = scope.frames.pop()
+            symbol_table.reset(function.context.symbol_table)
+        else:
+            symbol_table = SymbolTable(function.context.symbol_table, scope)
+        new_context.symbol_table = symbol_table
+
+        for idx, arg in enumerate(args):
+            if type(arg) in PLAIN_TYPES:
+                arg = box(arg, new_context, node.arg_nodes[idx])
+            else:
+                arg.set_Context(new_context)
+                if isinstance(arg, Function):
+                    symbol_table.captured = True
+
+            if scope:
+                symbol_table.slots[scope.arg_slots[idx]] = arg
+            else:
+                symbol_table.set(function.args[idx], arg)
+
+        try:
+            value = function.body(new_context)
+        finally:
+            if scope and not symbol_table.captured:
+                new_context.symbol_table = None
+                symbol_table.clear()
+                scope.frames.append(symbol_table)
+
+        if type(value) is not TailCall:
+            value = box(value, new_context, function.main_node)
+            if pending:
+                for pending_call in pending:
+                    pending_call[0].store(pending_call[1], value, pending_call is entry and value.context is new_context)
+            return value
+        function, args, node = value.function, value.args, value.node
+
+def define(node, body, context):
+    # handle_FuncDefNode(), for a body transpiled to the Python function body
+    func_val = PyFunction(node.var_name, node.main_node, node.arg_names, node.scope, body).set_Context(context).set_Pos(node.pos_start, node.pos_end)
+    func_val.memo = new_memo(node.deps)
+    context.symbol_table.captured = True
+
+    if node.var_name:
+        interpreter.bind(node, func_val, context)
+
+    return func_val
+
+def count(idx, end, step):
+    # the values handle_ForStatementNode() gives its loop variable, a range when they are all ints counting up
+    if type(idx) is int and type(end) is int and type(step) is int and step > 0:
+        return range(idx, end, step)
+    return count_loop(idx, end, step)
+
+def count_loop(idx, end, step):
+    # the next value is worked out before the body runs, as handle_ForStatementNode() does, so an error in it comes first
+    if step >= 0:
+        while idx < end:
+            value = idx
+            idx += step
+            yield value
+    else:
+        while idx > end:
+            value = idx
+            idx += step
+            yield value
+
+# for binop(), unaryop() and the handlers of the nodes that read a name or make a Bool, which keep no state
+interpreter = Interpreter()
+
+# names the generated code finds in its globals, beside the nodes and constants it uses
+NAMESPACE = {
+    '_interpreter': interpreter,
+    '_Interpreter': Interpreter,
+    '_Number': Number,
+    '_String': String,
+    '_box': box,
+    '_truthy': truthy,
+    '_plain': plain,
+    '_call': call_node,
+    '_define': define,
+    '_count': count,
+}
+
+class Transpiler:
+    def __init__(self):
+        # global name -> the node or constant it stands for in the generated code
+        self.namespace = dict(NAMESPACE)
+        # (indent, line, node) of every function the program defines, then of _main()
+        self.functions = []
+        self.count = 0
+        self.depth = 0
+        # whether the code being made is a function body with slots, in the list _slots
+        self.slots = False
+
+    def transpile(self, node, fn):
+        statements, value = self.emit(node)
+        self.function('_main', statements, value, node)
+
+        lines = [None]
+        source = []
+        for indent, line, line_node in self.functions:
+            source.append('    ' * indent + line)
+            lines.append(line_node)
+        source = '\n'.join(source) + '\n'
+
+        code = compile(ast.parse(source, f'<rapl {fn}>'), f'<rapl {fn}>', 'exec')
+        return Program(source, code, self.namespace, lines, node)
+
+    def function(self, name, statements, value, node, slots=False):
+        self.functions.append((0, f'def {name}(ctx):', node))
+        if slots:
+            self.functions.append((1, '_slots = ctx.symbol_table.slots', node))
+        self.functions.extend((indent + 1, line, line_node) for indent, line, line_node in statements)
+        self.functions.append((1, f'return {value}', node))
+
+    def name(self, value, prefix='_n'):
+        # a global name for a node or a constant
+        self.count += 1
+        name = f'{prefix}{self.count}'
+        self.namespace[name] = value
+        return name
+
+    def temp(self, prefix='_t'):
+        self.count += 1
+        return f'{prefix}{self.count}'
+
+    def emit(self, node):
+        # (statements, expression): the lines that run node, as (indent, line, node), then the expression for its value. The
+        # expression must be used before any other line runs, which may change what it reads
+        if self.depth > MAX_RECURSION:
+            return [], f'_Interpreter().exec({self.name(node)}, ctx)'
+
+        emitter = getattr(self, f'emit_{type(node).__name__}', None)
+        if emitter is None:
+            raise Exception(f"No emit_{type(node).__name__} method defined")
+
+        self.depth += 1
+        try:
+            return emitter(node)
+        finally:
+            self.depth -= 1
+
+    def operands(self, nodes):
+        # (statements, expressions) for nodes run one after the other: an expression is kept in a temporary before the lines of a
+        # later node run
+        statements = []
+        values = []
+        for node in nodes:
+            lines, value = self.emit(node)
+            if lines:
+                for idx, (previous, previous_node) in enumerate(values):
+                    if not TEMPORARY.fullmatch(previous):
+                        temp = self.temp()
+                        statements.append((0, f'{temp} = {previous}', previous_node))
+                        values[idx] = (temp, previous_node)
+                statements.extend(lines)
+            values.append((value, node))
+        return statements, [value for value, _ in values]
+
+    def truthy(self, value):
+        temp = self.temp('_v')
+        return f'({temp} != 0 if type({temp} := {value}) is int else _truthy({temp}))'
+
+    def emit_NumberNode(self, node):
+        if type(node.value) is int:
+            return [], repr(node.value)
+        return [], self.name(node.value, '_c')
+
+    def emit_StringNode(self, node):
+        return [], repr(node.value)
+
+    def emit_BoolNode(self, node):
+        return [], f'_interpreter.handle_BoolNode({self.name(node)}, ctx)'
+
+    def emit_BinOpNode(self, node):
+        statements, (left, right) = self.operands((node.left, node.right))
+        left_temp, right_temp = self.temp('_l'), self.temp('_r')
+
+        guard = f'(type({left_temp} := {left}) is int) & (type({right_temp} := {right}) is int)'
+        if node.op == KINDS['/']:
+            guard = f'({guard}) and {right_temp} != 0'
+        operation = INT_OPERATIONS[node.op].format(left_temp, right_temp)
+
+        return statements, f'(({operation}) if {guard} else _interpreter.binop({self.name(node)}, {left_temp}, {right_temp}, ctx))'
+
+    def emit_UnaryOpNode(self, node):
+        statements, value = self.emit(node.node)
+        if node.op != KINDS['-'] and node.op != KINDS[KEYWORDS['NOT']]:
+            return statements, f'_interpreter.unaryop({self.name(node)}, {value}, ctx)'
+
+        temp = self.temp('_u')
+        fallback = f'_interpreter.unaryop({self.name(node)}, {temp}, ctx)'
+
+        if node.op == KINDS['-']:
+            return statements, f'({temp} * -1 if type({temp} := {value}) is int else {fallback})'
+        return statements, f'((1 if {temp} == 0 else 0) if type({temp} := {value}) is int else {fallback})'
+
+    def emit_VarAccessNode(self, node):
+        fallback = f'_interpreter.handle_VarAccessNode({self.name(node)}, ctx)'
+        if node.depth != 0 or not self.slots:
+            return [], fallback
+
+        # one of the function's own names, read like handle_VarAccessNode() does, which reads it when it isn't a plain value
+        return [], (f'(_v.value if (_v := _slots[{node.slot}]) is not None and _v.context is ctx and '
+                    f'(type(_v) is _Number or type(_v) is _String) else {fallback})')
+
+    def emit_VarAssignNode(self, node):
+        statements, value = self.emit(node.value_node)
+        temp = self.temp()
+        statements.append((0, f'{temp} = _box({value}, ctx, {self.name(node.value_node)})', node))
+        statements.append((0, self.store(node, temp), node))
+        return statements, temp
+
+    def store(self, node, value):
+        if node.slot is None:
+            return f'ctx.symbol_table.set({node.var_name!r}, {value})'
+        return f'_slots[{node.slot}] = {value}'
+
+    def emit_IfStatementNode(self, node):
+        cases = [(self.emit(check), self.emit(expr), expr) for check, expr in node.cases]
+        else_case = (self.emit(node.else_case), node.else_case) if node.else_case else None
+
+        if not any(check[0] or expr[0] for check, expr, _ in cases) and not (else_case and else_case[0][0]):
+            value = f'_box({else_case[0][1]}, ctx, {self.name(else_case[1])})' if else_case else 'None'
+            for (_, check), (_, expr), expr_node in reversed(cases):
+                value = f'(_box({expr}, ctx, {self.name(expr_node)}) if {self.truthy(check)} else {value})'
+            return [], value
+
+        # a case with lines of its own, each case after the first goes in the else of the one before it
+        temp = self.temp()
+        statements = []
+        indent = 0
+        for (check_lines, check), (expr_lines, expr), expr_node in cases:
+            statements.extend((indent + line_indent, line, line_node) for line_indent, line, line_node in check_lines)
+            statements.append((indent, f'if {self.truthy(check)}:', expr_node))
+            statements.extend((indent + 1 + line_indent, line, line_node) for line_indent, line, line_node in expr_lines)
+            statements.append((indent + 1, f'{temp} = _box({expr}, ctx, {self.name(expr_node)})', expr_node))
+            statements.append((indent, 'else:', expr_node))
+            indent += 1
+
+        if else_case:
+            (else_lines, value), else_node = else_case
+            statements.extend((indent + line_indent, line, line_node) for line_indent, line, line_node in else_lines)
+            statements.append((indent, f'{temp} = _box({value}, ctx, {self.name(else_node)})', else_node))
+        else:
+            statements.append((indent, f'{temp} = None', node))
+        return statements, temp
+
+    def emit_ForStatementNode(self, node):
+        nodes = [node.start_node, node.end_node] + ([node.step_node] if node.step_node else [])
+        statements, values = self.operands(nodes)
+        start, end = values[0], values[1]
+        step = values[2] if node.step_node else '1'
+
+        idx, end_temp, step_temp, counter, value = self.temp('_i'), self.temp('_e'), self.temp('_s'), self.temp('_k'), self.temp('_x')
+        # all three are run before any of them is made plain, like in handle_ForStatementNode()
+        statements.append((0, f'{idx}, {end_temp}, {step_temp} = {start}, {end}, {step}', node))
+        statements.append((0, f'{idx}, {end_temp}, {step_temp} = _plain({idx}), _plain({end_temp}), _plain({step_temp})', node))
+        # the loop variable is one Number, counted on in place like in handle_ForStatementNode()
+        statements.append((0, f'{counter} = _Number({idx})', node))
+        statements.append((0, f'for {value} in _count({idx}, {end_temp}, {step_temp}):', node))
+        statements.append((1, f'{counter}.value = {value}', node))
+        if node.slot is None:
+            statements.append((1, f'ctx.symbol_table.set({node.var_name!r}, {counter})', node))
+        else:
+            statements.append((1, f'if _slots[{node.slot}] is not {counter}: _slots[{node.slot}] = {counter}', node))
+
+        body_lines, body = self.emit(node.main_node)
+        statements.extend((1 + indent, line, line_node) for indent, line, line_node in body_lines)
+        statements.append((1, body, node.main_node))
+        return statements, 'None'
+
+    def emit_WhileStatementNode(self, node):
+        check_lines, check = self.emit(node.check_node)
+        body_lines, body = self.emit(node.main_node)
+
+        if check_lines:
+            statements = [(0, 'while True:', node)]
+            statements.extend((1 + indent, line, line_node) for indent, line, line_node in check_lines)
+            statements.append((1, f'if not {self.truthy(check)}: break', node.check_node))
+        else:
+            statements = [(0, f'while {self.truthy(check)}:', node.check_node)]
+        statements.extend((1 + indent, line, line_node) for indent, line, line_node in body_lines)
+        statements.append((1, body, node.main_node))
+        return statements, 'None'
+
+    def emit_FuncDefNode(self, node):
+        # the body is a function of its own, at the top of the module, which runs in the Context of a call
+        depth, slots = self.depth, self.slots
+        self.depth, self.slots = 0, node.scope is not None
+        try:
+            body_lines, body = self.emit(node.main_node)
+            name = self.temp('_f')
+            self.function(name, body_lines, body, node.main_node, self.slots)
+        finally:
+            self.depth, self.slots = depth, slots
+
+        return [], f'_define({self.name(node)}, {name}, ctx)'
+
+    def emit_CallNode(self, node):
+        statements, values = self.operands([node.call_node] + node.arg_nodes)
+        return statements, f'_call({self.name(node)}, {values[0]}, [{", ".join(values[1:])}], ctx)'
+
+    def emit_StatementsNode(self, node):
+        statements = []
+        value = 'None'
+        for statement in node.statement_nodes:
+            if value != 'None':
+                statements.append((0, value, statement))
+            lines, value = self.emit(statement)
+            statements.extend(lines)
+
+        return statements, f'_box({value}, ctx, {self.name(node.statement_nodes[-1])})'
@@ -0,0 +1,67 @@
+# Validator.py
+# =====================================================================================================================================
+# Validate-only mode, for checking programs (in CI, an editor, ...) without running them. validate() reports every IllegalCharacter_
+# and SyntaxError_ in a program in one pass, where Run stops at the first one: the Lexer records each error and lexes on past it, and
+# Parser.validate() skips to the next statement after each error. Syntax errors on a line that already has a lexer error are left
+# out, since they are almost always caused by the characters the lexer had to skip.
+# validate_files() and validate_sources() check many programs in one call, spread over a pool of worker processes. A file that can't be
+# read or isn't UTF-8 gets a FileError_ as its one error.
+# =====================================================================================================================================
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .Lexer import Lexer
+from .Parser import Parser
+from .ErrorHandler import FileError_
+
+# below this many programs a batch is validated in this process, starting workers would cost more than it saves
+MIN_POOL_BATCH = 64
+
+def validate(fn, source):
+    # every error in source, in the order they appear in it, [] for a valid program
+    lexer = Lexer(fn, source)
+    lexer_errors = []
+    tokens, _ = lexer.tokenize(lexer_errors)
+    errors = Parser(tokens).validate()
+
+    if lexer_errors:
+        lines = set()
+        for error in lexer_errors:
+            lines.update(range(error.pos_start.ln, error.pos_end.ln + 1))
+        errors = lexer_errors + [error for error in errors if error.pos_start.ln not in lines]
+        errors.sort(key=lambda error: error.pos_start.idx)
+
+    return errors
+
+def validate_file(path):
+    # a file that can't be read is reported as its one error, so it doesn't cost the rest of the batch their results
+    try:
+        with open(path, encoding='utf-8') as file:
+            source = file.read()
+    except (OSError, UnicodeDecodeError) as exception:
+        return [FileError_(f"{path}: {exception}")]
+    return validate(path, source)
+
+def validate_files(paths, workers=None):
+    # {path: errors} for every file in paths
+    paths = list(paths)
+    return dict(zip(paths, run_batch(validate_file, paths, workers)))
+
+def validate_sources(sources, workers=None):
+    # errors for each (fn, source) pair, in the same order
+    sources = list(sources)
+    return run_batch(validate_source, sources, workers)
+
+def validate_source(item):
+    return validate(*item)
+
+def run_batch(function, items, workers):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(items) < MIN_POOL_BATCH:
+        return [function(item) for item in items]
+
+    # big chunks, so each worker gets its programs (and sends back its errors) a few times rather than once per program
+    chunksize = max(1, len(items) // (workers * 4))
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(function, items, chunksize=chunksize))
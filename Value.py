@@ -2,8 +2,8 @@ from .ErrorHandler import RTError
 
 class Value:
     def __init__(self):
-        self.set_Pos()
-        self.set_Context()
+        self.start_pos = self.end_pos = None
+        self.context = None
 
     def set_Pos(self, start_pos=None, end_pos=None):
         self.start_pos = start_pos